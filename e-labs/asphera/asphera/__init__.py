@@ -0,0 +1,14 @@
+"""
+Asphera preprocessing package
+=============================
+Shared engine that converts FEM pkl.bz2 results into the JSON data read by
+the Asphera web app. Section specifics live in ``sections/<ID>.json``.
+
+Usage:
+  python -m asphera [SECTION ...] [-j JOBS] [--source DIR] [--output DIR]
+"""
+
+from .config import Section, load_section, available_sections
+from .engine import process_case
+
+__version__ = "3.0.0"
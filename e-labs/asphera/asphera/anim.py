@@ -0,0 +1,127 @@
+"""
+Asphera animation encoding
+==========================
+Consecutive tire positions differ only slightly, so an animation view can be
+stored as integer quanta instead of rounded floats:
+
+  k_t    = round(v_t / step)          step = 2 * error bound
+  base   = k_0                        (first frame)
+  deltas = k_t - k_(t-1), t >= 1      (mostly tiny integers)
+
+Every decoded value ``step * cumsum(k)`` is within the error bound of the
+interpolated field. The bound is absolute (in the published unit: µε, MPa,
+mm) or relative to the largest magnitude of the field over the view.
+NaN grid points (outside the mesh) are null in base/deltas; the running
+quanta simply carry over them.
+
+``split_view`` turns a view into a small index plus one chunk per
+(timestep, field), or per field for delta-encoded views (a delta stream is
+only decodable as a whole), so the viewer fetches just what it displays.
+"""
+
+import numpy as np
+
+from .output import Values, iter_json
+
+
+def parse_error_bound(text):
+    """'0.5' -> ("abs", 0.5); '1%' -> ("rel", 0.01)."""
+    text = str(text).strip()
+    kind, value = ("rel", float(text[:-1]) / 100) if text.endswith("%") else ("abs", float(text))
+    if not value > 0:
+        raise ValueError(f"error bound must be positive: {text!r}")
+    return kind, value
+
+
+def _grid(values):
+    return values.array if isinstance(values, Values) else np.array(values, dtype=float)
+
+
+def _json_size(obj):
+    return sum(len(chunk) for chunk in iter_json(obj))
+
+
+def encode_field(stack, bound):
+    """
+    Quantize and delta-encode one field, ``stack`` of shape (frames, ...).
+    Returns (encoded dict, max abs error).
+    """
+    kind, value = bound
+    peak = np.nanmax(np.abs(stack)) if np.isfinite(stack).any() else 0.0
+    err = value * peak if kind == "rel" else value
+    step = 2.0 * err if err > 0 else 1.0
+    gaps = np.isnan(stack)
+    k = np.round(np.where(gaps, 0.0, stack) / step)
+    # Carry the running quanta over gaps so the next delta stays small
+    for t in range(1, len(k)):
+        k[t][gaps[t]] = k[t - 1][gaps[t]]
+    decoded = np.where(gaps, np.nan, k * step)
+    max_err = float(np.nanmax(np.abs(decoded - stack))) if (~gaps).any() else 0.0
+    deltas = np.diff(k, axis=0)
+    return {
+        "step": step, "errorBound": err, "maxError": max_err,
+        "base": Values(np.where(gaps[0], np.nan, k[0]), 0),
+        "deltas": Values(np.where(gaps[1:], np.nan, deltas), 0),
+    }, max_err
+
+
+def encode_animation(view, bound):
+    """
+    Encode one animation view ({"axis1", "depths", "frames"}) field by field.
+    Returns (encoded view, stats) with stats[field] = {errorBound, maxError,
+    ratio}; ratio compares JSON sizes of the rounded frames and the encoding.
+    """
+    frames = view["frames"]
+    out = {"axis1": view["axis1"], "depths": view["depths"], "encoding": "delta",
+           "timesteps": [f["timestep"] for f in frames], "fields": {}}
+    stats = {}
+    if not frames:
+        return out, stats
+    for field, first in frames[0]["fields"].items():
+        stack = np.stack([_grid(f["fields"][field]["values"]) for f in frames])
+        enc, max_err = encode_field(stack, bound)
+        out["fields"][field] = {"unit": first["unit"], **enc}
+        raw = sum(_json_size(Values(g)) for g in stack)
+        packed = _json_size(enc["base"]) + _json_size(enc["deltas"])
+        stats[field] = {"errorBound": enc["errorBound"], "maxError": max_err, "ratio": raw / packed}
+    return out, stats
+
+
+def decode_animation(view):
+    """Inverse of encode_animation: back to {"axis1", "depths", "frames"}."""
+    fields = {}
+    for field, enc in view["fields"].items():
+        base = np.array(_grid(enc["base"]), dtype=float)
+        deltas = np.array(_grid(enc["deltas"]), dtype=float).reshape((-1,) + base.shape)
+        k = np.concatenate([np.nan_to_num(base)[None], np.nan_to_num(deltas)]).cumsum(axis=0)
+        gaps = np.concatenate([np.isnan(base)[None], np.isnan(deltas)])
+        fields[field] = (np.where(gaps, np.nan, k * enc["step"]), enc["unit"])
+    frames = [{"timestep": ts, "fields": {f: {"values": Values(v[i]), "unit": u}
+                                          for f, (v, u) in fields.items()}}
+              for i, ts in enumerate(view["timesteps"])]
+    return {"axis1": view["axis1"], "depths": view["depths"], "frames": frames}
+
+
+def split_view(view, key):
+    """
+    (index, chunks) for one animation view; chunks is a list of (name, obj)
+    with names relative to the case folder. The index keeps the axes and a
+    stub per frame, and ``chunk`` is the name template of the chunk files.
+    """
+    if view.get("encoding") == "delta":
+        index = {"axis1": view["axis1"], "depths": view["depths"], "encoding": "delta",
+                 "frames": [{"timestep": ts} for ts in view["timesteps"]],
+                 "units": {f: enc["unit"] for f, enc in view["fields"].items()},
+                 "chunk": f"frames/{key}/{{field}}"}
+        chunks = [(f"frames/{key}/{f}", {"field": f, "timesteps": view["timesteps"], **enc})
+                  for f, enc in view["fields"].items()]
+        return index, chunks
+    frames = view["frames"]
+    index = {"axis1": view["axis1"], "depths": view["depths"],
+             "frames": [{"timestep": fr["timestep"]} for fr in frames],
+             "units": {f: d["unit"] for f, d in frames[0]["fields"].items()} if frames else {},
+             "chunk": f"frames/{key}/ts{{timestep}}_{{field}}"}
+    chunks = [(f"frames/{key}/ts{fr['timestep']}_{f}",
+               {"timestep": fr["timestep"], "field": f, "unit": d["unit"], "values": d["values"]})
+              for fr in frames for f, d in fr["fields"].items()]
+    return index, chunks
@@ -0,0 +1,159 @@
+"""
+Asphera stage benchmark
+=======================
+Generates synthetic cases (see synthetic.py) at several mesh sizes and times
+each pipeline stage on them, then repeats the run under tracemalloc for the
+peak memory allocated by each stage.
+
+  load        load_case from pkl.bz2 (no cache)
+  load_cache  load_case from a warm columnar cache
+  critical    CriticalTable.build for every profile component
+  profiles    extract_profile for every profile definition
+  slices      static longitudinal + transverse slices (includes triangulation)
+  animation   all animation frames, both planes (operators reused)
+  grid3d      extract_3d_grid
+  write       contours + point cloud JSON
+
+Usage:
+  python -m asphera.bench                              # small, medium
+  python -m asphera.bench --sizes small medium large --section FD_P1 --json bench.json
+"""
+
+import argparse, contextlib, io, json, os, shutil, sys, tempfile, time, tracemalloc
+
+from .config import CONTOUR_FIELDS, TSTEP_RANGE, load_section
+from .engine import (axis_centers, extract_3d_grid, extract_contour_slice, extract_profile,
+                     needed_columns)
+from .interp import OperatorCache
+from .mesh import load_case
+from .output import write_artifact
+from .reduce import CriticalTable
+from .synthetic import SIZES, write_case
+
+STAGES = ["load", "load_cache", "critical", "profiles", "slices", "animation", "grid3d", "write"]
+
+
+class Stages:
+    """Times (and with ``track`` memory-profiles) named blocks of code."""
+
+    def __init__(self, track=False):
+        self.track = track
+        self.results = {}
+
+    @contextlib.contextmanager
+    def __call__(self, name):
+        if self.track:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        yield
+        entry = self.results.setdefault(name, {})
+        entry["seconds"] = time.perf_counter() - t0
+        if self.track:
+            entry["peakMB"] = (tracemalloc.get_traced_memory()[1] - base) / 1024 / 1024
+
+
+def run_pipeline(sec, case, ts_list, src, work, stage):
+    """Run every stage once on ``src``; ``stage`` is a Stages instance."""
+    cols = needed_columns(sec)
+    cache = os.path.join(work, "cache")
+    with stage("load"):
+        load_case(src, case, ts_list, cols)
+    load_case(src, case, ts_list, cols, cache_dir=cache)       # warm the columnar cache
+    with stage("load_cache"):
+        data = load_case(src, case, ts_list, cols, cache_dir=cache)
+    with stage("critical"):
+        table = CriticalTable.build(sec, data, [d[0] for d in sec.profile_defs])
+    with stage("profiles"):
+        profiles = [extract_profile(sec, data, d[0], d[1], table) for d in sec.profile_defs]
+    ts = profiles[0]["timestep"] - 1
+    x_center, z_center = axis_centers(data.mesh)
+    kw = dict(x_center=x_center, z_center=z_center, ops=OperatorCache())
+    with stage("slices"):
+        contours = {p: extract_contour_slice(sec, data, ts, p, c, CONTOUR_FIELDS, 80, **kw)
+                    for p, c in (("XY", z_center), ("YZ", x_center))}
+    with stage("animation"):
+        contours["animation"] = {
+            p: [extract_contour_slice(sec, data, i, p, c, CONTOUR_FIELDS, 60, **kw)
+                for i in range(TSTEP_RANGE[0] - 1, min(TSTEP_RANGE[1], len(data)))]
+            for p, c in (("XY", z_center), ("YZ", x_center))}
+    with stage("grid3d"):
+        pc = extract_3d_grid(data, ts, x_center, z_center)
+    with stage("write"):
+        write_artifact(work, "contours", contours, report=False)
+        write_artifact(work, "pointcloud", pc, report=False)
+    return len(data.mesh)
+
+
+def bench_size(sec, size, root, memory=True):
+    nx, nz, per_layer = SIZES[size]
+    case, ts_list = next(iter(sec.cases.items()))
+    src = os.path.join(root, f"{sec.id}_{size}")
+    if not os.path.isdir(os.path.join(src, case)):
+        write_case(sec, case, src, nx, nz, per_layer, ts_list)
+    result = {"size": size, "mesh": [nx, nz, per_layer], "timesteps": len(ts_list)}
+    passes = [False, True] if memory else [False]
+    for track in passes:
+        work = tempfile.mkdtemp(dir=root)
+        stage = Stages(track)
+        if track:
+            tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):   # engine progress output
+                result["nodes"] = run_pipeline(sec, case, ts_list, src, work, stage)
+        finally:
+            if track:
+                tracemalloc.stop()
+            shutil.rmtree(work, ignore_errors=True)
+        # Times come from the untracked pass (tracemalloc slows allocation-heavy code)
+        for name, entry in stage.results.items():
+            result.setdefault("stages", {}).setdefault(name, {}).update(
+                {"peakMB": entry["peakMB"]} if track else {"seconds": entry["seconds"]})
+    return result
+
+
+def print_result(r):
+    print(f"\n  {r['size']}: {r['nodes']} nodes x {r['timesteps']} timesteps")
+    print(f"    {'stage':<12s}{'time':>10s}{'peak alloc':>14s}")
+    for name in STAGES:
+        e = r["stages"][name]
+        mem = f"{e['peakMB']:.1f} MB" if "peakMB" in e else "-"
+        print(f"    {name:<12s}{e['seconds']:>8.2f} s{mem:>14s}")
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m asphera.bench",
+                                 description="Time and memory-profile each Asphera stage.")
+    ap.add_argument("--sizes", nargs="+", choices=SIZES, default=["small", "medium"])
+    ap.add_argument("--section", default="TK_P1", help="section whose layers/profiles are used")
+    ap.add_argument("--workdir", default=None,
+                    help="keeps the generated sources between runs (default: a temp folder)")
+    ap.add_argument("--no-memory", dest="memory", action="store_false",
+                    help="skip the tracemalloc pass")
+    ap.add_argument("--json", default=None, help="also write the results to this file")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sec = load_section(args.section)
+    root = args.workdir or tempfile.mkdtemp(prefix="asphera-bench-")
+    os.makedirs(root, exist_ok=True)
+    print(f"Asphera bench: {args.section}, sizes {', '.join(args.sizes)} (data in {root})")
+    results = []
+    try:
+        for size in args.sizes:
+            results.append(bench_size(sec, size, root, args.memory))
+            print_result(results[-1])
+    finally:
+        if not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"section": args.section, "results": results}, f, indent=1)
+        print(f"\n  [OK] {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
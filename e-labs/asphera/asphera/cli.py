@@ -0,0 +1,218 @@
+"""
+Asphera command line
+====================
+Schedules every (section, scenario) pair over a process pool so a full
+rebuild takes about as long as the slowest single case. Scenarios without FEM
+results are skipped. With a cache, the first scenario of each section runs
+ahead of its siblings: they share its geometry, so they then read the
+columnar and operator caches it wrote instead of every worker building the
+same operators at once. The run ends with data/scenarios.json.
+
+Usage:
+  python -m asphera                       # all sections
+  python -m asphera TK_P1 FD_P1 -j 2      # selected sections, 2 workers
+  python -m asphera --source D:/FEM --output ./data --cache ./.cache
+  python -m asphera --format binary       # typed-array .bin files for the viewer
+  python -m asphera --anim-error 0.5%     # delta-encoded animation frames
+  python -m asphera --stream              # one timestep in memory at a time
+  python -m asphera --points 3000         # adaptive point cloud, 3000-point budget
+  python -m asphera --interp layer        # point cloud interpolated within each layer
+  python -m asphera --lod                 # slice LOD pyramid (20/40/80/160) + tire focus tile
+  python -m asphera --envelope            # + max/min over all tire positions per node
+  python -m asphera --upsample 4          # 3 interpolated animation frames per timestep
+  python -m asphera --compare             # then compare/<A>_vs_<B> for every pair of sections
+"""
+
+import argparse, os, sys, time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from . import compare
+from .anim import parse_error_bound
+from .config import SOURCE_DIR, OUTPUT_DIR, CACHE_DIR, LOD_LEVELS, available_sections, load_section
+from .engine import process_case, write_scenario_index
+from .interp import POINT_METHODS
+from .output import FORMATS, LAYOUTS
+from .store import source_path
+
+
+def _run_task(section_id, case, ts_list, options):
+    # Runs inside a worker process: reload the section there so only plain
+    # strings, lists and the options dict cross the process boundary.
+    sec = load_section(section_id)
+    t0 = time.perf_counter()
+    process_case(sec, case, ts_list, **options)
+    return section_id, case, time.perf_counter() - t0
+
+
+def build_tasks(section_ids, **options):
+    """
+    One (section, case, ts_list, options) task per scenario with FEM results
+    under ``options["source_dir"]``; options go to process_case.
+    """
+    tasks = []
+    for sid in section_ids:
+        sec = load_section(sid)
+        for case, ts_list in sec.cases.items():
+            if not any(os.path.exists(source_path(options["source_dir"], case, ts)) for ts in ts_list):
+                print(f"  [SKIP] {case}: no FEM results")
+                continue
+            tasks.append((sid, case, ts_list, options))
+    return tasks
+
+
+def schedule(tasks, jobs, lead_first):
+    """
+    Run ``tasks`` on ``jobs`` worker processes; yields (task, future) as they
+    finish. With ``lead_first`` only the first task of every section starts
+    right away, its siblings are queued once it is done.
+    """
+    groups = {}
+    for task in tasks:
+        groups.setdefault(task[0], []).append(task)
+    pending = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        def submit(batch):
+            for task in batch:
+                pending[pool.submit(_run_task, *task)] = task
+
+        for group in groups.values():
+            submit(group[:1] if lead_first else group)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                task = pending.pop(fut)
+                group = groups[task[0]]
+                if lead_first and task is group[0]:
+                    submit(group[1:])
+                yield task, fut
+
+
+def parse_levels(text):
+    """argparse type for --lod: comma-separated grid resolutions, e.g. "20,40,80,160"."""
+    try:
+        levels = sorted({int(v) for v in text.split(",") if v.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {text!r}")
+    if not levels or levels[0] < 8:
+        raise argparse.ArgumentTypeError("LOD levels must be integers >= 8")
+    return levels
+
+
+def parse_budget(text):
+    """argparse type for --points: a point budget (>= 1)."""
+    try:
+        budget = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an integer, got {text!r}")
+    if budget < 1:
+        raise argparse.ArgumentTypeError("the point budget must be >= 1")
+    return budget
+
+
+def parse_factor(text):
+    """argparse type for --upsample: animation frames per timestep interval (>= 1)."""
+    try:
+        factor = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an integer, got {text!r}")
+    if factor < 1:
+        raise argparse.ArgumentTypeError("the upsampling factor must be >= 1")
+    return factor
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m asphera",
+                                 description="Convert FEM pkl.bz2 results into Asphera JSON data.")
+    ap.add_argument("sections", nargs="*",
+                    help=f"section ids to process (default: all of {', '.join(available_sections())})")
+    ap.add_argument("-j", "--jobs", type=int, default=None,
+                    help="worker processes (default: one per task, capped at CPU count; 1 = run inline)")
+    ap.add_argument("--source", default=SOURCE_DIR,
+                    help="folder holding <CASE>/<CASE>_3DResponse_tire<ts>.pkl.bz2 files")
+    ap.add_argument("--output", default=OUTPUT_DIR, help="output data folder")
+    ap.add_argument("--cache", default=CACHE_DIR,
+                    help="folder for reusable intermediate data (columns, slice operators, build manifest)")
+    ap.add_argument("--no-cache", dest="cache", action="store_const", const=None,
+                    help="keep intermediate data in memory only (disables incremental rebuilds)")
+    ap.add_argument("--force", action="store_true",
+                    help="rebuild every artifact even if its inputs are unchanged")
+    ap.add_argument("--format", dest="fmt", choices=FORMATS, default="json",
+                    help="contour/point-cloud encoding: plain JSON or typed-array .bin + manifest")
+    ap.add_argument("--anim-error", type=parse_error_bound, default=None, metavar="BOUND",
+                    help="delta-encode animation frames to this error bound, absolute in the "
+                         "field unit (0.5) or relative to the field peak (1%%)")
+    ap.add_argument("--layout", choices=LAYOUTS, default="chunked",
+                    help="animation frames as one file per (plane, timestep, field) under frames/ "
+                         "(default) or bundled inside contours")
+    ap.add_argument("--stream", action="store_true",
+                    help="process one timestep at a time (bounded memory, same output)")
+    ap.add_argument("--points", type=parse_budget, default=None, metavar="BUDGET",
+                    help="adaptive point cloud with at most BUDGET points, refined where the "
+                         "response varies (default: the fixed lattice)")
+    ap.add_argument("--interp", choices=POINT_METHODS, default="nearest",
+                    help="point-cloud interpolation: nearest node, k-nearest inverse distance, "
+                         "or trilinear within each layer (never across an interface)")
+    ap.add_argument("--lod", nargs="?", type=parse_levels, const=LOD_LEVELS, default=None,
+                    metavar="RES,...",
+                    help="static slices as a level-of-detail pyramid (default levels "
+                         f"{','.join(map(str, LOD_LEVELS))}) plus a high-resolution tile "
+                         "around the tire footprint, fetched by the viewer on zoom")
+    ap.add_argument("--envelope", action="store_true",
+                    help="add the per-node max/min over all tire positions (and the timestep "
+                         "of each) to the static contours and the point cloud")
+    ap.add_argument("--upsample", type=parse_factor, default=None, metavar="N",
+                    help="animation frames per timestep interval: N-1 frames interpolated from "
+                         "the neighbouring tire positions are added between every pair "
+                         "(see tween.py)")
+    ap.add_argument("--compare", action="store_true",
+                    help="after the cases, write difference/ratio artifacts for every pair of "
+                         "the processed sections to compare/ (see compare.py)")
+    ap.add_argument("--no-precompress", dest="precompress", action="store_false",
+                    help="skip the .gz/.br variants written next to every file")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    section_ids = args.sections or available_sections()
+    tasks = build_tasks(section_ids, source_dir=args.source, output_dir=args.output,
+                        cache_dir=args.cache, force=args.force, fmt=args.fmt,
+                        anim_error=args.anim_error, layout=args.layout,
+                        precompress=args.precompress, stream=args.stream, points=args.points,
+                        interp=args.interp, lod=args.lod, envelope=args.envelope,
+                        upsample=args.upsample)
+    jobs = args.jobs or min(len(tasks), os.cpu_count() or 1)
+    # The CPUs left per case worker run the KD-tree queries in parallel
+    for task in tasks:
+        task[3]["workers"] = max(1, (os.cpu_count() or 1) // jobs)
+
+    print(f"Asphera: {len(tasks)} scenario(s) from {len(section_ids)} section(s), {jobs} worker(s)")
+    t0 = time.perf_counter()
+    failed = []
+    # Inline (-j 1) or pooled, a failing case is reported and the run goes on
+    if jobs <= 1:
+        results = ((task, lambda task=task: _run_task(*task)) for task in tasks)
+    else:
+        results = ((task, fut.result)
+                   for task, fut in schedule(tasks, jobs, lead_first=args.cache is not None))
+    for task, result in results:
+        case = task[1]
+        try:
+            _, _, dt = result()
+            print(f"  [DONE] {case} in {dt:.1f} s")
+        except Exception as exc:
+            print(f"  [FAIL] {case}: {exc!r}")
+            failed.append(case)
+    write_scenario_index(args.output)
+
+    if args.compare:
+        compare.run(compare.section_cases(section_ids, args.output), args.output, args.cache,
+                    fmt=args.fmt, force=args.force, precompress=args.precompress)
+
+    print(f"\n[DONE] Preprocessing complete in {time.perf_counter() - t0:.1f} s"
+          + (f" ({len(failed)} failed: {', '.join(failed)})" if failed else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
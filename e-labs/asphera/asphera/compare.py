@@ -0,0 +1,278 @@
+"""
+Asphera cross-section comparison
+================================
+Compares the processed cases of two sections without the browser loading
+both: the static slices, the critical depth profiles and the point cloud of
+case B are set against case A on common axes, and every field gets
+
+  diff    B - A                      (field unit)
+  ratio   B / A, null where |A| is below RATIO_FLOOR x its peak
+
+written to ``<output>/compare/<A>_vs_<B>.*`` (JSON or binary like the cases).
+The inputs are the published per-case artifacts (read back in either
+format), so no FEM data is reloaded. Resampling is separable linear
+interpolation applied to every field of a grid at once; the common axes are
+the union of both grids inside their overlap, so identical grids compare
+exactly. Profiles are paired by (component, detection layer, category).
+
+With a cache folder, a pair is only rebuilt when one of its inputs changed.
+
+Usage:
+  python -m asphera.compare                        # every pair of processed sections
+  python -m asphera.compare TK_P1 FD_P1 --output ./data
+  python -m asphera.compare --pairs TK_P1:SMA_P1 LV_P1:FD_P1
+"""
+
+import argparse, itertools, os, sys, time
+import numpy as np
+
+from .config import CACHE_DIR, CONTOUR_FIELDS, OUTPUT_DIR, available_sections, load_section
+from .engine import case_output_dir, field_unit
+from .graph import BuildGraph, code_version, file_fingerprint
+from .output import FORMATS, Values, artifact_files, precompress_all, read_artifact, write_artifact
+
+COMPARE_DIR = "compare"
+RATIO_FLOOR = 1e-3      # of the peak |A| of the field; smaller |A| gives no ratio
+RATIO_DECIMALS = 3
+LOD_COMPARE = 80        # pyramid level compared when a case was built with --lod
+
+
+# ──────────────────────────────────────────────────────
+#  RESAMPLING
+# ──────────────────────────────────────────────────────
+def common_axis(a, b):
+    """Union of the increasing axes ``a`` and ``b`` inside their overlap."""
+    u = np.union1d(a, b)
+    return u[(u >= max(a[0], b[0])) & (u <= min(a[-1], b[-1]))]
+
+
+def resample(values, src, dst):
+    """
+    Multilinear resampling of ``values`` (..., n_1, ..., n_k) from the axes
+    ``src`` onto ``dst`` (k increasing axes each); leading dimensions are
+    batched. Exact grid hits keep their value even next to a NaN.
+    """
+    out = np.asarray(values, dtype=float)
+    k = len(src)
+    for d, (s, t) in enumerate(zip(src, dst)):
+        axis = out.ndim - k + d
+        s, t = np.asarray(s, dtype=float), np.asarray(t, dtype=float)
+        if len(s) == 1:
+            out = np.take(out, np.zeros(len(t), dtype=int), axis=axis)
+            continue
+        i = np.clip(np.searchsorted(s, t, side="right") - 1, 0, len(s) - 2)
+        width = s[i + 1] - s[i]
+        f = np.clip(np.where(width > 0, (t - s[i]) / np.where(width > 0, width, 1.0), 0.0), 0.0, 1.0)
+        shape = [1] * out.ndim
+        shape[axis] = len(t)
+        f = f.reshape(shape)
+        lo, hi = np.take(out, i, axis=axis), np.take(out, i + 1, axis=axis)
+        with np.errstate(invalid="ignore"):
+            out = np.where(f == 0, lo, np.where(f == 1, hi, lo * (1 - f) + hi * f))
+    return out
+
+
+def difference(a, b, batch_dims=1):
+    """(B - A, B / A) of two same-shape stacks; the ratio floor is per leading entry."""
+    peak_axes = tuple(range(batch_dims, a.ndim))
+    floor = RATIO_FLOOR * np.abs(np.nan_to_num(a)).max(axis=peak_axes, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.where(np.abs(a) > floor, b / a, np.nan)
+    return b - a, ratio
+
+
+def peak(values):
+    """Value with the largest magnitude (NaN ignored)."""
+    flat = np.asarray(values, dtype=float).ravel()
+    if np.isnan(flat).all():
+        return None
+    return round(float(flat[np.nanargmax(np.abs(flat))]), 4)
+
+
+def _array(seq):
+    return np.array(seq, dtype=float)      # None (JSON null) -> NaN
+
+
+def _fields_out(fields, a, b):
+    """{field: {unit, diff, ratio, peakA, peakB}} of the stacks ``a``, ``b`` (fields first)."""
+    diff, ratio = difference(a, b)
+    return {f: {"unit": field_unit(f)[1], "diff": Values(diff[k]),
+                "ratio": Values(ratio[k], RATIO_DECIMALS), "peakA": peak(a[k]), "peakB": peak(b[k])}
+            for k, f in enumerate(fields)}
+
+
+# ──────────────────────────────────────────────────────
+#  ARTIFACTS
+# ──────────────────────────────────────────────────────
+def static_slices(case_dir):
+    """(overview timestep, {view: slice}) of a processed case, at LOD_COMPARE if pyramided."""
+    contours = read_artifact(case_dir, "contours")
+    views = {v: contours[v] for v in ("longitudinal", "transverse")}
+    for view, lod in (contours.get("lod") or {}).items():
+        levels = lod["levels"]
+        level = LOD_COMPARE if LOD_COMPARE in levels else levels[-1]
+        if level != levels[0]:
+            views[view] = read_artifact(case_dir, lod["chunk"].replace("{level}", str(level)))
+    return contours["timestep"], views
+
+
+def compare_slices(sa, sb):
+    fields = [f for f in CONTOUR_FIELDS if f in sa["fields"] and f in sb["fields"]]
+    src_a = (_array(sa["depths"]), _array(sa["axis1"]))
+    src_b = (_array(sb["depths"]), _array(sb["axis1"]))
+    dst = (common_axis(src_a[0], src_b[0]), common_axis(src_a[1], src_b[1]))
+    a = resample(np.stack([_array(sa["fields"][f]["values"]) for f in fields]), src_a, dst)
+    b = resample(np.stack([_array(sb["fields"][f]["values"]) for f in fields]), src_b, dst)
+    return {"axis1": Values(dst[1], 1), "depths": Values(dst[0], 1),
+            "fields": _fields_out(fields, a, b)}
+
+
+def compare_profiles(pa, pb):
+    """Profiles present in both cases, resampled onto the union of their depths."""
+    index = {(p["component"], p["detectionLayer"], p["category"]): p for p in pb}
+    out = []
+    for p in pa:
+        q = index.get((p["component"], p["detectionLayer"], p["category"]))
+        if q is None:
+            continue
+        # Interface depths appear twice (one value per layer); the later entry is used
+        da, db = _array(p["depths"]), _array(q["depths"])
+        depths = common_axis(np.unique(da), np.unique(db))
+        a = resample(_array(p["values"]), [da], [depths])
+        b = resample(_array(q["values"]), [db], [depths])
+        diff, ratio = difference(a, b, batch_dims=0)
+        out.append({"component": p["component"], "detectionLayer": p["detectionLayer"],
+                    "category": p["category"], "label": p["label"],
+                    "timestep": {"a": p["timestep"], "b": q["timestep"]},
+                    "critical": {"a": p["criticalValue"], "b": q["criticalValue"]},
+                    "depths": Values(depths, 2), "a": Values(a), "b": Values(b),
+                    "diff": Values(diff), "ratio": Values(ratio, RATIO_DECIMALS)})
+    return out
+
+
+def compare_pointclouds(pa, pb):
+    """Lattice point clouds on common axes; None if either cloud is adaptive."""
+    if "nx" not in pa or "nx" not in pb:
+        return None
+    fields = [f for f in CONTOUR_FIELDS if f in pa["fields"] and f in pb["fields"]]
+
+    def stack(pc):
+        shape = (pc["nx"], pc["ny"], pc["nz"])
+        axes = (_array(pc["x"]), _array(pc["depths"]), _array(pc["z"]))
+        return np.stack([_array(pc["fields"][f]["values"]).reshape(shape) for f in fields]), axes
+
+    va, src_a = stack(pa)
+    vb, src_b = stack(pb)
+    dst = tuple(common_axis(s, t) for s, t in zip(src_a, src_b))
+    a, b = resample(va, src_a, dst), resample(vb, src_b, dst)
+    n = [len(d) for d in dst]
+    return {"x": Values(dst[0], 1), "depths": Values(dst[1], 1), "z": Values(dst[2], 1),
+            "nx": n[0], "ny": n[1], "nz": n[2],
+            "fields": _fields_out(fields, a.reshape(len(fields), -1), b.reshape(len(fields), -1))}
+
+
+def compare_cases(dir_a, dir_b):
+    """Comparison document of two processed case folders (B against A)."""
+    ts_a, slices_a = static_slices(dir_a)
+    ts_b, slices_b = static_slices(dir_b)
+    result = {"a": os.path.basename(dir_a), "b": os.path.basename(dir_b),
+              "timestep": {"a": ts_a, "b": ts_b}, "ratioFloor": RATIO_FLOOR, "slices": {}}
+    for view in ("longitudinal", "transverse"):
+        result["slices"][view] = compare_slices(slices_a[view], slices_b[view])
+    # Structure and profiles are JSON whatever the case format
+    result["profiles"] = compare_profiles(read_artifact(dir_a, "profiles", "json")["profiles"],
+                                          read_artifact(dir_b, "profiles", "json")["profiles"])
+    result["pointcloud"] = compare_pointclouds(read_artifact(dir_a, "pointcloud"),
+                                               read_artifact(dir_b, "pointcloud"))
+    return result
+
+
+def _fingerprints(case_dir):
+    files = [fn for name in ("structure", "profiles", "contours", "pointcloud")
+             for fmt in FORMATS for fn in artifact_files(name, fmt)]
+    return {fn: file_fingerprint(os.path.join(case_dir, fn)) for fn in files}
+
+
+def run(case_dirs, output_dir=OUTPUT_DIR, cache_dir=None, pairs=None, fmt="json", force=False,
+        precompress=True):
+    """
+    Write ``compare/<A>_vs_<B>`` for every pair of ``case_dirs`` (id -> folder),
+    or for the (A, B) ids in ``pairs``. Returns the names written.
+    """
+    out_dir = os.path.join(output_dir, COMPARE_DIR)
+    manifest = os.path.join(cache_dir, "build", f"{COMPARE_DIR}.json") if cache_dir else None
+    graph = BuildGraph(out_dir, manifest, force=force)
+    pairs = pairs or list(itertools.combinations(case_dirs, 2))
+    written = []
+    print(f"\nAsphera compare: {len(pairs)} pair(s)")
+    for a, b in pairs:
+        name = f"{a}_vs_{b}"
+        missing = [c for c in (a, b) if not os.path.isdir(case_dirs.get(c, ""))]
+        if missing:
+            print(f"  [SKIP] {name}: {', '.join(missing)} not processed")
+            continue
+        graph.add(name, {"a": _fingerprints(case_dirs[a]), "b": _fingerprints(case_dirs[b]),
+                         "ratioFloor": RATIO_FLOOR, "lod": LOD_COMPARE,
+                         "code": code_version("compare", "output")},
+                  outputs=artifact_files(name, fmt))
+        if not graph.stale(name):
+            print(f"  [OK] {name} (up to date)")
+            continue
+        t0 = time.perf_counter()
+        doc = compare_cases(case_dirs[a], case_dirs[b])
+        if doc["pointcloud"] is None:
+            print(f"  [SKIP] {name}: point cloud (adaptive sampling has no common lattice)")
+        write_artifact(out_dir, name, doc, fmt)
+        graph.done(name)
+        written.append(name)
+        print(f"    {len(doc['profiles'])} profiles paired, {time.perf_counter() - t0:.2f} s")
+    if precompress and os.path.isdir(out_dir):
+        precompress_all(out_dir)
+    return written
+
+
+def section_cases(section_ids, output_dir=OUTPUT_DIR):
+    """{case id: output folder} of every case of ``section_ids``."""
+    dirs = {}
+    for sid in section_ids:
+        for s in load_section(sid).scenarios:
+            dirs[s["id"]] = case_output_dir(s["case"], output_dir)
+    return dirs
+
+
+def _pair(text):
+    a, sep, b = text.partition(":")
+    if not sep or not a or not b:
+        raise argparse.ArgumentTypeError(f"expected A:B, got {text!r}")
+    return a, b
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m asphera.compare",
+                                 description="Write difference/ratio artifacts between processed sections.")
+    ap.add_argument("sections", nargs="*",
+                    help=f"section ids to pair up (default: all of {', '.join(available_sections())})")
+    ap.add_argument("--pairs", nargs="+", type=_pair, default=None, metavar="A:B",
+                    help="compare only these case ids (B against A)")
+    ap.add_argument("--output", default=OUTPUT_DIR, help="processed data folder (compare/ goes inside)")
+    ap.add_argument("--cache", default=CACHE_DIR, help="folder for the build manifest")
+    ap.add_argument("--no-cache", dest="cache", action="store_const", const=None,
+                    help="always rebuild every pair")
+    ap.add_argument("--format", dest="fmt", choices=FORMATS, default="json")
+    ap.add_argument("--force", action="store_true", help="rebuild pairs even if up to date")
+    ap.add_argument("--no-precompress", dest="precompress", action="store_false")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    case_dirs = section_cases(args.sections or available_sections(), args.output)
+    if args.pairs:
+        case_dirs.update({c: os.path.join(args.output, c) for pair in args.pairs for c in pair
+                          if c not in case_dirs})
+    run(case_dirs, args.output, args.cache, args.pairs, args.fmt, args.force, args.precompress)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Asphera configuration
+=====================
+Constants shared by every pavement section, plus the loader for the
+per-section files in ``sections/<ID>.json`` (layers, scenarios, profiles).
+
+A section runs one FEM case per scenario. ``"scenarios"`` lists the values
+of every SCENARIO_AXES axis and names the case of each combination with a
+pattern, e.g. ``"case": "TK_P1_L{load}_SL{slope}"``; the description may use
+the same fields. Sections with a plain ``"cases"`` map still load (one
+scenario per case, axes unset). The data id of a scenario (its output
+folder) is the case name without a trailing flat-slope ``_SL0``.
+"""
+
+import itertools, json, os, re
+
+# ──────────────────────────────────────────────────────
+#  SHARED CONFIGURATION  (identical for all sections)
+# ──────────────────────────────────────────────────────
+TSTEP_RANGE = [4, 16]
+
+MODEL_LENGTH  = 9520.0
+WHEEL_LENGTH  = 1320.0
+MODEL_WIDTH   = 8432.0
+WHEEL_WIDTH   = 232.0
+MODEL_DEPTH   = 5000.0
+
+SOURCE_DIR = os.environ.get(
+    "ASPHERA_SOURCE_DIR",
+    r"C:\Users\johannc2\Box\R27-252 EV\Tasks\Task 3 - Pavement FEM\Post-Processing")
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+CACHE_DIR  = os.environ.get(
+    "ASPHERA_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"))
+SECTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sections")
+
+IGNORE_SURFACE = 5.0
+
+CONTOUR_FIELDS = ["E11", "E22", "E33", "E23", "E13", "U2", "SMises"]
+
+# Scenario matrix axes: (label, unit) as shown by the viewer
+SCENARIO_AXES = {
+    "load":  ("Wheel load", "kips"),
+    "slope": ("Slope", "%"),
+    "tire":  ("Tire configuration", ""),
+}
+
+# 3D grid resolution
+GRID_NX, GRID_NZ = 22, 18
+
+# Contour level-of-detail pyramid (--lod) and the tile around the tire footprint
+LOD_LEVELS   = [20, 40, 80, 160]
+FOCUS_RES    = 160
+FOCUS_DEPTH  = 600.0     # mm below the surface
+FOCUS_MARGIN = 0.5       # footprint fraction added on each side
+
+
+# ──────────────────────────────────────────────────────
+#  SECTIONS
+# ──────────────────────────────────────────────────────
+class Section:
+    """
+    One pavement section (TK_P1, FD_P1, ...) as described by its config file.
+    Attribute names mirror the constants of the former preprocess_<SEC>.py scripts.
+    """
+
+    def __init__(self, spec):
+        self.id          = spec["id"]
+        self.name        = spec["name"]
+        self.description = spec["description"]
+        self.scenarios   = build_scenarios(spec)
+        self.cases       = {s["case"]: s["timesteps"] for s in self.scenarios}
+        self.overview_group = spec["overviewGroup"]
+
+        layers = spec["layers"]
+        self.structure   = [l["id"] for l in layers]
+        self.labels      = [l["label"] for l in layers]
+        self.thicknesses = [float(l["thickness"]) for l in layers]
+        self.colors      = [l["color"] for l in layers]
+
+        # (component, detection_layer, category, label, viewType, layerGroup)
+        self.profile_defs = [
+            (p["component"], p["detectionLayer"], p["category"],
+             p["label"], p["viewType"], p["layerGroup"])
+            for p in spec["profiles"]
+        ]
+        self.y_ranges = build_y_ranges(self.structure, self.thicknesses)
+
+    def __repr__(self):
+        return f"Section({self.id!r}, layers={self.structure})"
+
+    def scenario(self, case):
+        """Scenario dict of ``case``."""
+        for s in self.scenarios:
+            if s["case"] == case:
+                return s
+        raise KeyError(f"{self.id}: no scenario runs case {case!r}")
+
+    def describe(self, case):
+        """Description of ``case``, with its axis values filled in."""
+        s = self.scenario(case)
+        return self.description.format(**{a: s[a] for a in SCENARIO_AXES})
+
+
+def scenario_id(case):
+    """Data id (output folder name) of a FEM case: only a trailing ``_SL0`` is dropped."""
+    return re.sub(r"_SL0$", "", case)
+
+
+def build_scenarios(spec):
+    """
+    Scenario dicts (id, case, timesteps and the value of every SCENARIO_AXES
+    axis) of a section spec, in matrix order: the first one is the default.
+    """
+    matrix = spec.get("scenarios")
+    if matrix is None:
+        scenarios = [{"id": scenario_id(case), "case": case, "timesteps": list(ts),
+                      **dict.fromkeys(SCENARIO_AXES)} for case, ts in spec["cases"].items()]
+    else:
+        scenarios = []
+        for values in itertools.product(*(matrix.get(a, [None]) for a in SCENARIO_AXES)):
+            axes = dict(zip(SCENARIO_AXES, values))
+            case = matrix["case"].format(section=spec["id"], **axes)
+            scenarios.append({"id": scenario_id(case), "case": case,
+                              "timesteps": list(matrix["timesteps"]), **axes})
+        if len({s["case"] for s in scenarios}) < len(scenarios):
+            raise ValueError(f"{spec['id']}: case pattern {matrix['case']!r} must name every axis "
+                             "with more than one value")
+    if len({s["id"] for s in scenarios}) < len(scenarios):
+        raise ValueError(f"{spec['id']}: two cases share a data id "
+                         f"({', '.join(s['case'] for s in scenarios)})")
+    return scenarios
+
+
+def build_y_ranges(structure, thicknesses):
+    y_ranges, cum = {}, 0.0
+    for layer, thick in zip(structure, thicknesses):
+        y_ranges[layer] = (MODEL_DEPTH - cum - thick, MODEL_DEPTH - cum)
+        cum += thick
+    return y_ranges
+
+
+def available_sections():
+    return sorted(fn[:-5] for fn in os.listdir(SECTIONS_DIR) if fn.endswith(".json"))
+
+
+def load_section(section_id):
+    fp = os.path.join(SECTIONS_DIR, f"{section_id}.json")
+    if not os.path.exists(fp):
+        raise KeyError(f"Unknown section {section_id!r} "
+                       f"(available: {', '.join(available_sections())})")
+    with open(fp, encoding="utf-8") as f:
+        return Section(json.load(f))
@@ -0,0 +1,815 @@
+"""
+Asphera preprocessing engine
+============================
+Converts FEM pkl.bz2 data into lightweight JSON files for the Asphera web app.
+Every function that depends on the layer structure takes the ``Section`` it
+is working on, so one engine serves all pavement sections.
+
+Outputs:
+  - data/<CASE>/structure.json   : Layer geometry & model metadata
+  - data/<CASE>/profiles.json    : Critical depth-profile curves (grouped by layer)
+  - data/<CASE>/contours.json    : Cross-section heatmaps + multi-field animation
+  - data/<CASE>/pointcloud.json  : 3D grid point cloud for isometric view
+  - data/scenarios.json          : Processed scenarios of every section (viewer switcher)
+
+With ``envelope`` the static contours and the point cloud also carry the
+per-node max/min over all tire positions (``<FIELD>_max``, ``_min``,
+``_abs``), each with the timestep where it occurs (see reduce.Envelope).
+With ``upsample`` the animation gets in-between frames at fractional
+timesteps (see tween.py).
+
+Each run also leaves a run_report.json (see trace.py) with the time, CPU,
+peak-memory growth and bytes written of every stage, per file and per frame,
+under the cache (or the temp folder), never in the published data.
+"""
+
+import json, os, shutil, tempfile
+import numpy as np
+
+from .anim import encode_animation, split_view
+from .config import (
+    TSTEP_RANGE, MODEL_LENGTH, WHEEL_LENGTH, MODEL_WIDTH, WHEEL_WIDTH, MODEL_DEPTH,
+    SOURCE_DIR, OUTPUT_DIR, IGNORE_SURFACE, CONTOUR_FIELDS, GRID_NX, GRID_NZ,
+    FOCUS_RES, FOCUS_DEPTH, FOCUS_MARGIN, SCENARIO_AXES, available_sections, load_section,
+    scenario_id,
+)
+from .graph import BuildGraph, FrameCheckpoints, code_version, file_fingerprint
+from .interp import OperatorCache
+from .mesh import iter_case, load_case
+from .output import Values, artifact_files, precompress_all, size_report, write_artifact
+from .reduce import ENVELOPE_KINDS, CriticalTable, Envelope, is_more_critical
+from .sampling import adaptive_points
+from .store import GEOMETRY_COLUMNS, source_path
+from .trace import REPORT_FILE, Tracer, compare, span
+from .tween import upsample_view
+
+SHARED_OPERATORS = 64   # operators/triangulations kept per process across cases
+_OPERATORS = {}         # cache dir -> OperatorCache shared by the cases of one process
+
+
+# ──────────────────────────────────────────────────────
+#  HELPERS
+# ──────────────────────────────────────────────────────
+def needed_columns(sec):
+    """Geometry plus every field read by the contour, point-cloud and profile stages."""
+    cols = GEOMETRY_COLUMNS + CONTOUR_FIELDS + [p[0] for p in sec.profile_defs]
+    return list(dict.fromkeys(cols))
+
+
+def field_unit(field):
+    """(scale, unit) of a published field: strains in microstrain, U2 in mm, stresses in MPa."""
+    if field.startswith("E"):
+        return 1e6, "\u00b5\u03b5"
+    return 1.0, "mm" if field == "U2" else "MPa"
+
+
+def envelope_fields(envelope, fields, op):
+    """
+    ``<field>_<kind>`` entries of ``envelope`` (a reduce.Envelope over the
+    nodes ``op`` reads) on the output points of ``op``: values are
+    interpolated, the timesteps (1-based stack index) come from the dominant
+    node.
+    """
+    out = {}
+    for field in fields:
+        scale, unit = field_unit(field)
+        for kind in ENVELOPE_KINDS:
+            vals, idx = envelope.extreme(field, kind)
+            out[f"{field}_{kind}"] = {"values": Values(op.apply(vals) * scale), "unit": unit,
+                                      "timesteps": Values(op.pick(idx + 1), 0)}
+    return out
+
+
+def resolve_contour_slice_by_layers(sec, slc, a1, a2):
+    """
+    Resolve duplicate (a1, a2) at layer interfaces so each coordinate appears once.
+    At interfaces, nodes from the layer above and below share the same coordinates;
+    we assign them consistently: top layer keeps 'first', bottom keeps 'last',
+    middle layers: upper interface keep 'last', lower interface keep 'first'.
+    (Mirrors process_layers logic from the original implementation.)
+
+    One sort-based pass over every (row, layer) a row falls in (bounds
+    inclusive): rows are deduplicated per (layer, block, key), where the
+    block of a middle layer is its interior (not deduplicated), lower or
+    upper interface; the survivors are ranked (layer, block, row) and the
+    first of each key wins (top layer wins). ``_key`` is the integer (a1, a2)
+    key of the mesh NodeIndex. Returns the kept rows of ``slc`` in that order.
+    """
+    y = slc[a2].to_numpy()   # Yn_elem in both XY and YZ planes
+    key = slc["_key"].to_numpy()
+    y_lower = np.array([sec.y_ranges[lay][0] for lay in sec.structure])
+    y_upper = np.array([sec.y_ranges[lay][1] for lay in sec.structure])
+    last = len(sec.structure) - 1
+
+    rows, lay = np.nonzero((y[:, None] >= y_lower) & (y[:, None] <= y_upper))
+    ly, k = y[rows], key[rows]
+    middle = (lay > 0) & (lay < last)
+    block = np.where(middle & (ly == y_lower[lay]), 1, np.where(middle & (ly == y_upper[lay]), 2, 0))
+    keep_last = ((lay == last) & (lay > 0)) | (block == 2)
+
+    # First (or last) row of every (layer, block, key) group; middle interiors all stay
+    order = np.lexsort((rows, k, block, lay))
+    new_group = np.ones(len(order) + 1, dtype=bool)
+    new_group[1:-1] = ((lay[order][1:] != lay[order][:-1]) | (block[order][1:] != block[order][:-1])
+                       | (k[order][1:] != k[order][:-1]))
+    keep = np.empty(len(order), dtype=bool)
+    keep[order] = np.where(keep_last[order], new_group[1:], new_group[:-1])
+    keep |= middle & (block == 0)
+
+    # Concatenated layer by layer, the first occurrence of each key wins
+    cand = np.flatnonzero(keep)
+    cand = cand[np.lexsort((rows[cand], block[cand], lay[cand]))]
+    _, first = np.unique(k[cand], return_index=True)
+    return slc.iloc[rows[cand[np.sort(first)]]]
+
+
+def extract_profile(sec, data, component, det_layer, table=None):
+    """
+    Depth profile through the critical node of ``component`` in ``det_layer``.
+    ``table`` is a CriticalTable shared by all profile definitions of a case.
+    """
+    table = table or CriticalTable.build(sec, data, [component])
+    ts_idx, _, crit = table.critical(component, det_layer)
+    return profile_at(data, component, ts_idx, crit)
+
+
+def profile_at(data, component, ts_idx, crit, timestep=None):
+    """Depth profile of ``component`` at stack index ``ts_idx`` through mesh row ``crit``."""
+    mesh = data.mesh
+    field = data.values(component, ts_idx)
+    lx, ly, lz = mesh.x[crit], mesh.y[crit], mesh.z[crit]
+    crit_value = float(field[crit])
+    profile = mesh.columns.rows(mesh.columns.column_of(crit))  # top-down, then Node
+    depths = (MODEL_DEPTH - mesh.y[profile])
+    values = (field[profile] * 1e6)
+    crit_depth = float(MODEL_DEPTH - ly)
+    return {
+        "depths":        [round(float(d), 2) for d in depths],
+        "values":        [round(float(v), 4) for v in values],
+        "criticalDepth": round(crit_depth, 2),
+        "criticalValue": round(crit_value * 1e6, 4),
+        "timestep":      ts_idx + 1 if timestep is None else timestep,
+        "location": {"x": round(float(lx), 2),
+                     "y": round(float(ly), 2),
+                     "z": round(float(lz), 2)},
+    }
+
+
+def extract_contour_slice(sec, data, ts_idx, plane, coord_val, fields, grid_res=80,
+                          x_center=0.0, z_center=0.0, ops=None, box=None, envelope=None):
+    """
+    Extract interpolated 2D contour grids for multiple fields at stack index
+    ``ts_idx``. Returns dict with centered axis1, depths, and per-field values.
+    The slice triangulation comes from ``ops`` (an OperatorCache), so it is
+    built once per mesh and reused for every field, timestep and grid.
+    ``box`` (mesh coordinates, see interp.slice_grid) restricts the grid to
+    a uniform tile. ``envelope`` (a reduce.Envelope over the mesh rows) adds
+    the envelope fields.
+    """
+    ops = ops if ops is not None else OperatorCache()
+    # Resolve duplicate (a1, a2) at layer interfaces so contours don't jump at boundaries
+    with span("slice_operator", plane=plane, grid=grid_res):
+        op = ops.get(sec, data.mesh, plane, coord_val, grid_res, resolve_contour_slice_by_layers,
+                     box)
+    if op is None:
+        return None
+
+    center_shift = x_center if plane == "XY" else z_center
+    depth_vals = MODEL_DEPTH - op.g2
+    centered_a1 = op.g1 - center_shift
+
+    result = {
+        "axis1":  [round(float(x), 1) for x in centered_a1],
+        "depths": [round(float(d), 1) for d in depth_vals],
+        "fields": {},
+    }
+
+    for field in fields:
+        with span("field", field=field):
+            scale, unit = field_unit(field)
+            grid_vals = op.apply(data.fields[field][ts_idx]) * scale
+            result["fields"][field] = {"values": Values(grid_vals), "unit": unit}
+    if envelope is not None:
+        with span("envelope"):
+            result["fields"].update(envelope_fields(envelope, fields, op))
+    return result
+
+
+def extract_3d_grid(data, ts_idx, x_center, z_center, points=None, sec=None, ops=None,
+                    method="nearest", workers=1, envelope=None):
+    """
+    Extract a 3D regular grid of interpolated field values at stack index
+    ``ts_idx``. With ``points`` (a point budget) the samples are placed by
+    the adaptive octree of sampling.py instead, refined around the wheel
+    path and the layer interfaces of ``sec``. ``method`` is one of
+    interp.POINT_METHODS; its weights come from ``ops`` (an OperatorCache),
+    so further timesteps of the same mesh only cost a sparse mat-vec.
+    ``envelope`` (a reduce.Envelope over ``data.mesh.nodes``) adds the
+    envelope fields.
+    """
+    ops = ops if ops is not None else OperatorCache()
+    # Interface nodes are averaged over the layers that share them
+    print("    Deduplicating nodes ...")
+    nodes = data.mesh.nodes
+    with span("dedup_nodes"):
+        unique = {f: nodes.mean(data.values(f, ts_idx)) for f in CONTOUR_FIELDS}
+    print(f"    Unique nodes: {len(nodes)}")
+
+    coords = nodes.coords
+    x_min, x_max = coords[:, 0].min(), coords[:, 0].max()
+    z_min, z_max = coords[:, 2].min(), coords[:, 2].max()
+
+    # Depth points (from surface): dense near top
+    depth_pts = np.array([0, 5, 15, 30, 50, 80, 120, 155, 200, 305, 460, 600, 800, 1200])
+
+    if points:
+        # Same box as the lattice; samples go where the response varies
+        interfaces = np.cumsum(sec.thicknesses)[:-1] if sec is not None else []
+
+        def focus(lo, hi):
+            on_path = lo[2] <= z_center + WHEEL_WIDTH and hi[2] >= z_center - WHEEL_WIDTH
+            return on_path or any(lo[1] < d < hi[1] for d in interfaces)
+
+        print(f"    Adaptive sampling (budget {points} points) ...")
+        with span("adaptive_sampling", budget=points):
+            node_pts = np.column_stack([coords[:, 0], MODEL_DEPTH - coords[:, 1], coords[:, 2]])
+            pts = adaptive_points(node_pts, np.column_stack([unique[f] for f in CONTOUR_FIELDS]),
+                                  (x_min, depth_pts[0], z_min),
+                                  (x_max, depth_pts[-1], z_max), points, focus)
+        target_pts = np.column_stack([pts[:, 0], MODEL_DEPTH - pts[:, 1], pts[:, 2]])
+        print(f"    Adaptive cloud: {len(pts)} points")
+        result = {
+            "sampling": "adaptive",
+            "budget": points,
+            "count": len(pts),
+            "points": {"x": Values(pts[:, 0] - x_center, 1),
+                       "depth": Values(pts[:, 1], 1),
+                       "z": Values(pts[:, 2] - z_center, 1)},
+            "fields": {},
+        }
+    else:
+        # Build grid: uniform in X and Z, non-uniform in depth (dense near surface)
+        gx = np.linspace(x_min, x_max, GRID_NX)
+        gz = np.linspace(z_min, z_max, GRID_NZ)
+        gy = MODEL_DEPTH - depth_pts  # convert back to Yn_elem
+
+        grid_x, grid_y, grid_z = np.meshgrid(gx, gy, gz, indexing="ij")
+        target_pts = np.column_stack([grid_x.ravel(), grid_y.ravel(), grid_z.ravel()])
+
+        print(f"    3D grid: {GRID_NX} x {len(depth_pts)} x {GRID_NZ} = {len(target_pts)} points")
+
+        result = {
+            "x": [round(float(v - x_center), 1) for v in gx],
+            "depths": [round(float(d), 1) for d in depth_pts],
+            "z": [round(float(v - z_center), 1) for v in gz],
+            "nx": GRID_NX,
+            "ny": len(depth_pts),
+            "nz": GRID_NZ,
+            "fields": {},
+        }
+
+    print(f"    Building interpolator ({method}) ...")
+    with span("point_operator", method=method, points=len(target_pts)):
+        op = ops.points(sec, data.mesh, coords, target_pts, method, workers)
+
+    for field in CONTOUR_FIELDS:
+        print(f"    Interpolating {field} ...")
+        with span("field", field=field):
+            scale, unit = field_unit(field)
+            result["fields"][field] = {"values": Values(op.apply(unique[field]) * scale),
+                                       "unit": unit}
+    if envelope is not None:
+        print("    Envelope fields ...")
+        with span("envelope"):
+            result["fields"].update(envelope_fields(envelope, CONTOUR_FIELDS, op))
+
+    return result
+
+
+def focus_box(plane, peak):
+    """
+    Slice-grid box (a1_lo, a1_hi, a2_lo, a2_hi) of the tire footprint around
+    ``peak`` (mesh x, z), padded by FOCUS_MARGIN, down to FOCUS_DEPTH.
+    """
+    a1, half = (peak[0], WHEEL_LENGTH / 2) if plane == "XY" else (peak[1], WHEEL_WIDTH / 2)
+    half *= 1 + 2 * FOCUS_MARGIN
+    return a1 - half, a1 + half, MODEL_DEPTH - FOCUS_DEPTH, MODEL_DEPTH
+
+
+def slice_pyramid(sec, data, ts_idx, plane, coord_val, levels, peak, **slice_kw):
+    """
+    ({grid_res: slice} for every LOD level, focus tile) of one static slice.
+    Every grid is cut from the same cached triangulation.
+    """
+    pyramid = {}
+    for res in levels:
+        with span("lod", plane=plane, grid=res):
+            pyramid[res] = extract_contour_slice(sec, data, ts_idx, plane, coord_val,
+                                                 CONTOUR_FIELDS, res, **slice_kw)
+    with span("lod", plane=plane, grid="focus"):
+        focus = extract_contour_slice(sec, data, ts_idx, plane, coord_val, CONTOUR_FIELDS,
+                                      FOCUS_RES, box=focus_box(plane, peak), **slice_kw)
+    return pyramid, focus
+
+
+# ──────────────────────────────────────────────────────
+#  CASE DRIVER
+# ──────────────────────────────────────────────────────
+def axis_centers(mesh):
+    return float(np.median(mesh.x)), float(np.median(mesh.z))
+
+
+def animation_frame(sec, data, ts_idx, timestep, plane, coord, ckpt, **slice_kw):
+    """One multi-field animation frame, from ``ckpt`` if it holds it."""
+    key = f"{plane}_ts{timestep}"
+    frame = ckpt.get(key)
+    if frame is not None:
+        print(f"    Frame ts={timestep} ({plane}) [checkpoint]")
+        return frame
+    print(f"    Frame ts={timestep} ({plane}) ...")
+    with span("frame", plane=plane, timestep=timestep):
+        frame_data = extract_contour_slice(
+            sec, data, ts_idx, plane, coord, CONTOUR_FIELDS, grid_res=60, **slice_kw)
+        if frame_data is None:
+            return None
+        frame = {"timestep": timestep,
+                 "fields": {fld: frame_data["fields"][fld] for fld in CONTOUR_FIELDS}}
+        with span("checkpoint"):
+            ckpt.put(key, frame)
+    return frame
+
+
+def stream_case(sec, case, ts_list, source_dir, cache_dir, ops, ckpt=None, envelopes=()):
+    """
+    Single pass over the timesteps of ``case`` with one frame in memory at a
+    time. Running reductions pick every profile's critical timestep; the
+    frame of the current overview candidate is kept for the static contours
+    and point cloud. With ``ckpt`` (a FrameCheckpoints) the animation frames
+    are computed on the way. Every timestep is folded into the
+    reduce.Envelope objects of ``envelopes``.
+
+    Returns (overview CaseData, its stack index, {(comp, det): profile},
+    {plane: frames}). Output is identical to the load-everything path.
+    """
+    start, end = TSTEP_RANGE[0] - 1, TSTEP_RANGE[1]
+    comps = [d[0] for d in sec.profile_defs]
+    ov = next((d for d in sec.profile_defs if d[5] == sec.overview_group), sec.profile_defs[0])
+    best, overview = {}, None
+    frames = {"XY": [], "YZ": []}
+    for i, frame in iter_case(source_dir, case, ts_list, needed_columns(sec), cache_dir):
+        if not start <= i < end:
+            continue
+        with span("critical", timestep=i + 1):
+            table = CriticalTable.build(sec, frame, comps)
+            for comp, det, *_ in sec.profile_defs:
+                vals, rows = table.extreme(comp, det)
+                v = float(vals[0])
+                if (comp, det) not in best or is_more_critical(comp, v, best[(comp, det)][0]):
+                    best[(comp, det)] = (v, profile_at(frame, comp, 0, int(rows[0]), timestep=i + 1))
+                    if (comp, det) == (ov[0], ov[1]):
+                        overview = (frame, i)
+        if envelopes:
+            with span("envelope", timestep=i + 1):
+                for env in envelopes:
+                    env.update(frame, i)
+        if ckpt is not None:
+            x_center, z_center = axis_centers(frame.mesh)
+            for plane, coord in (("XY", z_center), ("YZ", x_center)):
+                fr = animation_frame(sec, frame, 0, i + 1, plane, coord, ckpt,
+                                     x_center=x_center, z_center=z_center, ops=ops)
+                if fr is not None:
+                    frames[plane].append(fr)
+        del frame
+    if overview is None:
+        raise ValueError(f"{case}: no timestep inside TSTEP_RANGE {TSTEP_RANGE}")
+    return overview[0], overview[1], {k: p for k, (_, p) in best.items()}, frames
+
+
+def write_chunk_dir(out_dir, sub, chunks, fmt):
+    """Write (name, obj) ``chunks`` (names under ``sub/``) and swap ``<out_dir>/<sub>`` in."""
+    tmp = f"{out_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    n = 0
+    with span("write", artifact=sub):
+        for name, obj in chunks:
+            write_artifact(tmp, name, obj, fmt, report=False)
+            n += 1
+    size = sum(os.path.getsize(os.path.join(root, fn))
+               for root, _, files in os.walk(tmp) for fn in files)
+    os.makedirs(os.path.join(tmp, sub), exist_ok=True)
+    shutil.rmtree(os.path.join(out_dir, sub), ignore_errors=True)
+    os.replace(os.path.join(tmp, sub), os.path.join(out_dir, sub))
+    shutil.rmtree(tmp, ignore_errors=True)
+    print(f"  [OK] {sub}/ ({n} chunks, {size/1024/1024:.1f} MB)")
+
+
+def write_frame_chunks(out_dir, animation, fmt, layout):
+    """
+    Chunked layout: replace every view of ``animation`` by its index and
+    write the chunks to ``<out_dir>/frames`` (swapped in as a whole).
+    """
+    if layout != "chunked":
+        shutil.rmtree(os.path.join(out_dir, "frames"), ignore_errors=True)
+        return
+    chunks = []
+    for key in list(animation):
+        animation[key], view_chunks = split_view(animation[key], key)
+        chunks += view_chunks
+    write_chunk_dir(out_dir, "frames", chunks, fmt)
+
+
+def case_output_dir(case, output_dir=OUTPUT_DIR):
+    return os.path.join(output_dir, scenario_id(case))
+
+
+def shared_operators(cache_dir=None):
+    """
+    The OperatorCache of this process for ``cache_dir``. Scenarios of one
+    section share the mesh geometry, so a worker running several of them
+    reuses the slice triangulations and operators in memory.
+    """
+    path = os.path.join(cache_dir, "operators") if cache_dir else None
+    if path not in _OPERATORS:
+        _OPERATORS[path] = OperatorCache(path, maxsize=SHARED_OPERATORS)
+    return _OPERATORS[path]
+
+
+def write_scenario_index(output_dir=OUTPUT_DIR):
+    """
+    ``<output_dir>/scenarios.json``: every scenario of every section whose
+    data folder exists, for the viewer's scenario switcher. The first
+    scenario of a section is its default.
+    """
+    sections = {}
+    for sid in available_sections():
+        sec = load_section(sid)
+        found = []
+        for s in sec.scenarios:
+            out = case_output_dir(s["case"], output_dir)
+            if os.path.exists(os.path.join(out, "structure.json")):
+                found.append({"id": s["id"], "case": s["case"],
+                              **{a: s[a] for a in SCENARIO_AXES},
+                              "description": sec.describe(s["case"])})
+        if found:
+            sections[sid] = {"name": sec.name, "default": found[0]["id"], "scenarios": found}
+    index = {"axes": {a: {"label": lbl, "unit": unit} for a, (lbl, unit) in SCENARIO_AXES.items()},
+             "sections": sections}
+    write_artifact(output_dir, "scenarios", index, report=False)
+    n = sum(len(v["scenarios"]) for v in sections.values())
+    print(f"  [OK] scenarios.json ({n} scenarios, {len(sections)} sections)")
+    return index
+
+
+def build_graph(sec, case, ts_list, source_dir, out_dir, cache_dir=None, force=False, fmt="json",
+                anim_error=None, layout="chunked", points=None, interp="nearest", lod=None,
+                envelope=False, upsample=None):
+    """Dependency graph of the case artifacts (see graph.py)."""
+    manifest = os.path.join(cache_dir, "build", f"{os.path.basename(out_dir)}.json") if cache_dir else None
+    g = BuildGraph(out_dir, manifest, force=force)
+    layers = {"structure": sec.structure, "thicknesses": sec.thicknesses}
+    g.add("sources", {"files": [file_fingerprint(source_path(source_dir, case, ts)) for ts in ts_list],
+                      "columns": needed_columns(sec),
+                      "code": code_version("store", "mesh")})
+    g.add("structure", {"layers": layers, "labels": sec.labels, "colors": sec.colors,
+                        "name": sec.name, "description": sec.describe(case), "format": fmt,
+                        "model": [MODEL_LENGTH, MODEL_WIDTH, MODEL_DEPTH, WHEEL_LENGTH, WHEEL_WIDTH],
+                        "tsteps": TSTEP_RANGE, "code": code_version("engine")},
+          deps=["sources"], outputs=artifact_files("structure", "json"))
+    g.add("profiles", {"layers": layers, "defs": sec.profile_defs, "tsteps": TSTEP_RANGE,
+                       "ignoreSurface": IGNORE_SURFACE, "code": code_version("engine", "reduce")},
+          deps=["sources"], outputs=artifact_files("profiles", "json"))
+    # Only the computational part of the profile definitions picks the overview timestep
+    g.add("overview", {"layers": layers, "group": sec.overview_group, "tsteps": TSTEP_RANGE,
+                       "defs": [(d[0], d[1], d[5]) for d in sec.profile_defs],
+                       "ignoreSurface": IGNORE_SURFACE, "code": code_version("reduce")},
+          deps=["sources"])
+    g.add("contours", {"layers": layers, "fields": CONTOUR_FIELDS, "tsteps": TSTEP_RANGE,
+                       "animError": anim_error, "layout": layout,
+                       "lod": [lod, FOCUS_RES, FOCUS_DEPTH, FOCUS_MARGIN] if lod else None,
+                       "envelope": code_version("reduce") if envelope else None,
+                       "upsample": [upsample, code_version("tween")] if upsample and upsample > 1 else None,
+                       "code": code_version("engine", "interp", "output", "anim")},
+          deps=["sources", "overview"],
+          outputs=artifact_files("contours", fmt) + (["frames"] if layout == "chunked" else [])
+                  + (["lod"] if lod else []))
+    g.add("pointcloud", {"fields": CONTOUR_FIELDS, "grid": [GRID_NX, GRID_NZ], "points": points,
+                         "interp": interp,
+                         "layers": layers if points or interp == "layer" else None,
+                         "envelope": [TSTEP_RANGE, code_version("reduce")] if envelope else None,
+                         "code": code_version("engine", "output", "sampling", "interp")},
+          deps=["sources", "overview"], outputs=artifact_files("pointcloud", fmt))
+    return g
+
+
+def process_case(sec, case, ts_list, source_dir=SOURCE_DIR, output_dir=OUTPUT_DIR,
+                 cache_dir=None, force=False, fmt="json", anim_error=None, layout="chunked",
+                 precompress=True, stream=False, points=None, interp="nearest", workers=1,
+                 lod=None, envelope=False, upsample=None):
+    """
+    Run the pipeline for one FEM case of ``sec`` and write its data files.
+    ``fmt`` selects how contours and point cloud are written ("json" or
+    "binary", see output.py); structure and profiles are always JSON.
+    ``anim_error`` (see anim.parse_error_bound) delta-encodes the animation
+    frames to that error bound instead of storing them at 4 decimals.
+    ``layout="chunked"`` writes the frames to ``frames/`` one file per
+    (plane, timestep, field) and leaves an index in contours; "bundle" keeps
+    them inside the contours file. ``precompress`` adds .gz/.br variants of
+    every file. ``stream`` processes one timestep at a time (see
+    stream_case) instead of loading the whole case; the output is the same.
+    ``points`` replaces the point-cloud lattice by an adaptive sampling with
+    that point budget (see sampling.py). ``interp`` picks how the point
+    cloud is interpolated (interp.POINT_METHODS), with ``workers`` threads
+    for the KD-tree queries. ``lod`` (grid resolutions, e.g. LOD_LEVELS)
+    makes the static slices a pyramid: the coarsest level stays in contours,
+    the others and a high-resolution tile around the tire footprint go to
+    ``lod/`` for the viewer to fetch on zoom. ``envelope`` adds the per-node
+    max/min over all tire positions to the static slices and the point cloud.
+    ``upsample`` (factor > 1) adds ``upsample - 1`` interpolated animation
+    frames between every pair of timesteps (see tween.py).
+    ``cache_dir`` (optional) holds the columnar timestep cache, the slice
+    interpolation operators, the build manifest, animation checkpoints and
+    the run report; with it, only artifacts whose inputs changed are rebuilt
+    (``force`` rebuilds everything). Without it the run report goes to the
+    temp folder (see report_path).
+    """
+    print(f"\n{'='*60}")
+    print(f"  Processing case: {case}")
+    print(f"{'='*60}")
+
+    out_dir = case_output_dir(case, output_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    # Reports left in the case folder by older versions would be published
+    for fn in (REPORT_FILE, REPORT_FILE.replace(".json", ".prev.json")):
+        if os.path.exists(os.path.join(out_dir, fn)):
+            os.remove(os.path.join(out_dir, fn))
+
+    tracer = Tracer("case", case=case)
+    with tracer.activate():
+        rebuilt = _run_case(sec, case, ts_list, source_dir, out_dir, cache_dir, force, fmt,
+                            anim_error, layout, precompress, stream, points, interp, workers, lod,
+                            envelope, upsample)
+    if rebuilt:
+        write_run_report(tracer, report_path(out_dir, cache_dir), section=sec.id,
+                         case=case, timesteps=len(ts_list),
+                         options={"format": fmt, "animError": anim_error, "layout": layout,
+                                  "precompress": precompress, "stream": stream,
+                                  "points": points, "interp": interp, "lod": lod,
+                                  "envelope": envelope, "upsample": upsample,
+                                  "cache": cache_dir is not None,
+                                  "force": force})
+    return out_dir
+
+
+def report_path(out_dir, cache_dir=None):
+    """Run report of the case folder ``out_dir``: under ``cache_dir`` (else the temp folder)."""
+    root = cache_dir or os.path.join(tempfile.gettempdir(), "asphera")
+    return os.path.join(root, "reports", os.path.basename(out_dir), REPORT_FILE)
+
+
+def write_run_report(tracer, path, **meta):
+    """Write the span tree of ``tracer`` and print its slowest stages against the last run."""
+    prev = None
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                prev = json.load(f)
+        except (OSError, ValueError):
+            prev = None
+    report = tracer.write(path, **meta)
+    rss = f", peak RSS {report['peakRSSMB']:.0f} MB" if report["peakRSSMB"] is not None else ""
+    print(f"\n  Run report: {path}")
+    print(f"    {report['wall']:.2f} s wall, {report['cpu']:.2f} s cpu{rss}, "
+          f"{report['bytes']/1024/1024:.1f} MB written")
+    for line in compare(report, prev):
+        print(line)
+    return report
+
+
+def _run_case(sec, case, ts_list, source_dir, out_dir, cache_dir, force, fmt, anim_error,
+              layout, precompress, stream, points, interp, workers, lod, envelope,
+              upsample):
+    """Body of process_case; returns False when every artifact was up to date."""
+    with span("graph"):
+        graph = build_graph(sec, case, ts_list, source_dir, out_dir, cache_dir, force, fmt,
+                            anim_error, layout, points, interp, lod, envelope, upsample)
+        stale = graph.stale_outputs()
+    if not stale:
+        print("  All artifacts up to date.")
+        if precompress:
+            precompress_all(out_dir)
+        return False
+    print(f"  Stale: {', '.join(stale)}\n")
+
+    # Slice operators are shared by every timestep (and scenario) with the same mesh geometry
+    ops = shared_operators(cache_dir)
+    builds, hits = ops.builds, ops.hits
+    # Finished animation frames are checkpointed so an interrupted run resumes
+    ckpt = None
+    if graph.stale("contours"):
+        ckpt = FrameCheckpoints(os.path.join(cache_dir, "checkpoints", os.path.basename(out_dir))
+                                if cache_dir else None, graph.hashes["contours"])
+        if force:
+            ckpt.clear()
+
+    # Per-node envelopes over all tire positions: per mesh row for the slices,
+    # per distinct node (interface duplicates averaged) for the point cloud
+    env = {}
+    if envelope:
+        env = {name: Envelope(CONTOUR_FIELDS, per_node=name == "pointcloud")
+               for name in ("contours", "pointcloud") if graph.stale(name)}
+
+    if stream:
+        # One timestep in memory at a time; animation frames are built on the way
+        print("  Streaming timesteps ...")
+        with span("stream"):
+            data, overview_ts, found, stream_frames = stream_case(
+                sec, case, ts_list, source_dir, cache_dir, ops, ckpt, list(env.values()))
+        overview_idx = 0
+    else:
+        # Load all timesteps (only the columns the pipeline reads) onto one shared mesh
+        with span("load"):
+            data = load_case(source_dir, case, ts_list, needed_columns(sec), cache_dir=cache_dir)
+        print(f"  Loaded {len(data)} timesteps: {len(data.mesh)} nodes, "
+              f"{data.nbytes/1024/1024:.1f} MB in memory.\n")
+        if env:
+            with span("envelope"):
+                env = {name: Envelope.build(data, CONTOUR_FIELDS, e.per_node)
+                       for name, e in env.items()}
+
+    # Compute axis centers
+    x_center, z_center = axis_centers(data.mesh)
+    print(f"  Axis centers: X={x_center:.0f}, Z={z_center:.0f}\n")
+
+    # ── 1. Structure metadata ───────────────────
+    if graph.stale("structure"):
+        interfaces = []
+        cum = 0.0
+        for layer, label, thick, color in zip(sec.structure, sec.labels, sec.thicknesses, sec.colors):
+            interfaces.append({
+                "id": layer, "label": label,
+                "thickness": thick, "color": color,
+                "depthTop": cum, "depthBottom": cum + thick,
+            })
+            cum += thick
+
+        structure = {
+            "id":   scenario_id(case),
+            "name": sec.name,
+            "description": sec.describe(case),
+            "model": {
+                "length": MODEL_LENGTH, "width": MODEL_WIDTH,
+                "depth": MODEL_DEPTH,
+                "wheelPathLength": WHEEL_LENGTH, "wheelPathWidth": WHEEL_WIDTH,
+                "xCenter": x_center, "zCenter": z_center,
+            },
+            "layers": interfaces,
+            "timesteps": {"start": TSTEP_RANGE[0], "end": TSTEP_RANGE[1],
+                          "total": TSTEP_RANGE[1] - TSTEP_RANGE[0] + 1},
+        }
+        if fmt != "json":
+            structure["format"] = fmt   # tells the viewer which files to fetch
+        with span("write", artifact="structure"):
+            write_artifact(out_dir, "structure", structure)
+        graph.done("structure")
+
+    # ── 2. Critical depth profiles ──────────────
+    # Always computed (cheap): the overview timestep below is read from them.
+    # One reduction pass answers the critical-timestep search of every definition
+    if not stream:
+        with span("critical"):
+            table = CriticalTable.build(sec, data, [d[0] for d in sec.profile_defs])
+    profiles = []
+    for comp, det, cat, lbl, vtype, lgroup in sec.profile_defs:
+        print(f"  Profile: {comp} @ {det} ({lgroup}) ...")
+        with span("profile", component=comp, layer=det):
+            p = dict(found[(comp, det)]) if stream else extract_profile(sec, data, comp, det, table)
+        p.update({"component": comp, "detectionLayer": det, "category": cat,
+                  "label": lbl, "viewType": vtype, "layerGroup": lgroup})
+        profiles.append(p)
+    if graph.stale("profiles"):
+        with span("write", artifact="profiles"):
+            write_artifact(out_dir, "profiles", {"profiles": profiles})
+        graph.done("profiles")
+
+    if not stream:
+        overview_ts = next(
+            (p["timestep"] - 1 for p in profiles if p.get("layerGroup") == sec.overview_group),
+            profiles[0]["timestep"] - 1,
+        )
+        overview_idx = overview_ts
+
+    # ── 3. Contour data + multi-field animation ─
+    if graph.stale("contours"):
+        slice_kw = dict(x_center=x_center, z_center=z_center, ops=ops)
+        print(f"\n  Static contours (ts={overview_ts+1}) ...")
+
+        contours = {
+            "timestep": overview_ts + 1,
+            "axisLabels": {
+                "longitudinal": "X - Traffic Direction (mm)",
+                "transverse":   "Z - Transverse Direction (mm)",
+            },
+        }
+
+        # Level-of-detail pyramid: coarsest level inline, the rest on demand
+        lod_chunks, lod_index = [], {}
+        if lod:
+            levels = sorted(lod)
+            ov = next((p for p in profiles if p.get("layerGroup") == sec.overview_group), profiles[0])
+            peak = (ov["location"]["x"], ov["location"]["z"])
+            print(f"  LOD levels {levels} + focus tile at X={peak[0]:.0f}, Z={peak[1]:.0f} ...")
+            for key, plane, coord in (("longitudinal", "XY", z_center), ("transverse", "YZ", x_center)):
+                pyramid, focus = slice_pyramid(sec, data, overview_idx, plane, coord, levels, peak,
+                                               envelope=env.get("contours"), **slice_kw)
+                contours[key] = pyramid[levels[0]]
+                lod_index[key] = {
+                    "levels": levels,
+                    "chunk": f"lod/{key}_{{level}}",
+                    "focus": {"chunk": f"lod/{key}_focus", "grid": FOCUS_RES,
+                              "axis1": [focus["axis1"][0], focus["axis1"][-1]],
+                              "depths": [focus["depths"][0], focus["depths"][-1]]},
+                }
+                lod_chunks += [(f"lod/{key}_{res}", pyramid[res]) for res in levels[1:]]
+                lod_chunks.append((f"lod/{key}_focus", focus))
+            contours["lod"] = lod_index
+        else:
+            # Static longitudinal slice
+            print(f"  Longitudinal slice (XY @ Z={z_center:.0f}) ...")
+            with span("slice", plane="XY"):
+                contours["longitudinal"] = extract_contour_slice(
+                    sec, data, overview_idx, "XY", z_center, CONTOUR_FIELDS,
+                    grid_res=80, envelope=env.get("contours"), **slice_kw)
+            # Static transverse slice
+            print(f"  Transverse slice (YZ @ X={x_center:.0f}) ...")
+            with span("slice", plane="YZ"):
+                contours["transverse"] = extract_contour_slice(
+                    sec, data, overview_idx, "YZ", x_center, CONTOUR_FIELDS,
+                    grid_res=80, envelope=env.get("contours"), **slice_kw)
+
+        # Animation: longitudinal (XY) and transverse (YZ) at each timestep, ALL fields.
+        if not stream:
+            print(f"\n  Animation frames (ts {TSTEP_RANGE[0]}-{TSTEP_RANGE[1]}, all fields) ...")
+        animation, upsampled = {}, {}
+        for key, plane, coord in (("longitudinal", "XY", z_center), ("transverse", "YZ", x_center)):
+            with span("animation", plane=plane):
+                axes = extract_contour_slice(
+                    sec, data, overview_idx, plane, coord, [], grid_res=60, **slice_kw)
+                if stream:
+                    frames = stream_frames[plane]
+                else:
+                    frames = [fr for fr in (
+                        animation_frame(sec, data, i, i + 1, plane, coord, ckpt, **slice_kw)
+                        for i in range(TSTEP_RANGE[0] - 1, min(TSTEP_RANGE[1], len(data))))
+                        if fr is not None]
+            animation[key] = {
+                "axis1":  axes["axis1"],
+                "depths": axes["depths"],
+                "frames": frames,
+            }
+            if upsample and upsample > 1:
+                n = len(frames)
+                with span("upsample", plane=plane):
+                    animation[key], upsampled[key] = upsample_view(animation[key], upsample,
+                                                                   along_x=(plane == "XY"))
+                print(f"  Upsampled {key} x{upsample}: {n} -> {len(animation[key]['frames'])} frames")
+                for fld, st in upsampled[key]["heldOut"].items():
+                    print(f"    {fld:<7s} held-out rms {st['rms']:.2%} "
+                          f"(blend {st['blendRms']:.2%})  max err {st['maxError']:.3g}")
+            if anim_error:
+                with span("encode", plane=plane):
+                    animation[key], stats = encode_animation(animation[key], anim_error)
+                print(f"  Delta-encoded {key} frames:")
+                for fld, st in stats.items():
+                    print(f"    {fld:<7s} max err {st['maxError']:.3g} "
+                          f"(bound {st['errorBound']:.3g})  {st['ratio']:.1f}x")
+        contours["animation"] = animation
+        print(f"  Slice operators: {ops.builds - builds} built, {ops.hits - hits} reused")
+        write_frame_chunks(out_dir, animation, fmt, layout)
+        for key, stats in upsampled.items():
+            animation[key]["upsample"] = stats
+        if lod:
+            write_chunk_dir(out_dir, "lod", lod_chunks, fmt)
+        else:
+            shutil.rmtree(os.path.join(out_dir, "lod"), ignore_errors=True)
+
+        with span("write", artifact="contours"):
+            write_artifact(out_dir, "contours", contours, fmt)
+        graph.done("contours")
+        ckpt.clear()
+
+    # ── 4. 3D point cloud grid ──────────────────
+    if graph.stale("pointcloud"):
+        print(f"\n  3D point cloud (ts={overview_ts+1}) ...")
+        with span("grid3d"):
+            pc = extract_3d_grid(data, overview_idx, x_center, z_center, points, sec, ops,
+                                 interp, workers, env.get("pointcloud"))
+        pc["timestep"] = overview_ts + 1
+        with span("write", artifact="pointcloud"):
+            write_artifact(out_dir, "pointcloud", pc, fmt)
+        graph.done("pointcloud")
+
+    if precompress:
+        with span("precompress"):
+            precompress_all(out_dir)
+    size_report(out_dir)
+    return True
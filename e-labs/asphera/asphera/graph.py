@@ -0,0 +1,136 @@
+"""
+Asphera build graph
+===================
+Each output artifact (structure, profiles, ...) is a node whose
+hash covers its inputs: source file fingerprints, the config constants it
+actually reads, the code modules that produce it, and the hashes of its
+upstream nodes. A rebuild only recomputes nodes whose hash changed since the
+last successful write, so editing a profile label rewrites the profiles
+alone and a layer color only the structure.
+
+``FrameCheckpoints`` stores finished animation frames under the hash of the
+contours node, so a crashed run resumes where it stopped.
+"""
+
+import hashlib, importlib, json, os, shutil
+import numpy as np
+
+from .output import Values, to_jsonable
+
+
+def digest(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def code_version(*modules):
+    """Hash of the source of the given modules (names relative to this package)."""
+    h = hashlib.sha1()
+    for name in modules:
+        # Imported on demand: a module run with -m is only registered as __main__
+        mod = importlib.import_module(f"{__package__}.{name}")
+        with open(mod.__file__, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def file_fingerprint(path):
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _write_json_atomic(path, obj):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f, separators=(",", ":"), default=to_jsonable)
+    os.replace(tmp, path)
+
+
+class BuildGraph:
+    """
+    Nodes are added in dependency order. Virtual nodes (no output file) only
+    carry a hash for their dependents. The manifest of the last successful
+    build lives at ``manifest_path``; without one every node is stale.
+    """
+
+    def __init__(self, out_dir, manifest_path=None, force=False):
+        self.out_dir = out_dir
+        self.manifest_path = manifest_path
+        self.force = force
+        self.hashes, self.files = {}, {}
+        self.built = {}
+        if manifest_path and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get("outputDir") == os.path.abspath(out_dir):
+                self.built = manifest.get("artifacts", {})
+
+    def add(self, name, inputs, deps=(), outputs=()):
+        self.hashes[name] = digest({"inputs": inputs, "deps": [self.hashes[d] for d in deps],
+                                    "outputs": list(outputs)})
+        if outputs:
+            self.files[name] = [os.path.join(self.out_dir, fn) for fn in outputs]
+        return self.hashes[name]
+
+    def stale(self, name):
+        if self.force or self.built.get(name) != self.hashes[name]:
+            return True
+        return not all(os.path.exists(fp) for fp in self.files.get(name, ()))
+
+    def stale_outputs(self):
+        return [n for n in self.files if self.stale(n)]
+
+    def done(self, name):
+        """Record ``name`` as built with its current hash."""
+        self.built[name] = self.hashes[name]
+        if self.manifest_path:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            _write_json_atomic(self.manifest_path, {"outputDir": os.path.abspath(self.out_dir),
+                                                    "artifacts": self.built})
+
+
+class FrameCheckpoints:
+    """
+    Per-frame .npz checkpoints under ``<root>/<node hash>/``; a no-op when
+    root is None. The grids keep full precision, so a resumed frame is
+    identical to a freshly computed one.
+    """
+
+    def __init__(self, root, node_hash):
+        self.dir = os.path.join(root, node_hash[:16]) if root else None
+        if self.dir and os.path.isdir(root):
+            # Checkpoints of older input hashes can never be resumed
+            for old in os.listdir(root):
+                if old != node_hash[:16]:
+                    shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+    def _path(self, key):
+        return os.path.join(self.dir, f"{key}.npz")
+
+    def get(self, key):
+        """The frame ({"timestep", "fields": {f: {"values", "unit"}}}) stored under ``key``."""
+        if not (self.dir and os.path.exists(self._path(key))):
+            return None
+        with np.load(self._path(key)) as z:
+            meta = json.loads(str(z["meta"]))
+            return {"timestep": meta["timestep"],
+                    "fields": {f: {"values": Values(z[f"f{i}"], d), "unit": unit}
+                               for i, (f, unit, d) in enumerate(meta["fields"])}}
+
+    def put(self, key, frame):
+        if not self.dir:
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        fields = list(frame["fields"].items())
+        meta = {"timestep": frame["timestep"],
+                "fields": [(f, d["unit"], d["values"].decimals) for f, d in fields]}
+        tmp = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, meta=json.dumps(meta),
+                     **{f"f{i}": d["values"].array for i, (_, d) in enumerate(fields)})
+        os.replace(tmp, self._path(key))
+
+    def clear(self):
+        if self.dir:
+            shutil.rmtree(self.dir, ignore_errors=True)
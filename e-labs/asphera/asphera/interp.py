@@ -0,0 +1,419 @@
+"""
+Asphera interpolation operators
+===============================
+``griddata(..., method="linear")`` rebuilds a Delaunay triangulation on every
+call, i.e. once per field, per slice, per animation frame. The triangulation
+only depends on the mesh geometry, so here it is built once per
+(plane, coord, mesh) and turned into a sparse barycentric weight matrix per
+output grid (every LOD level and focus tile of a slice shares it);
+interpolating a field is then a single sparse mat-vec.
+
+Results match ``griddata(method="linear")``: same triangulation, same
+simplex search, NaN outside the convex hull.
+
+The 3D point cloud uses the same idea: a PointOperator holds the sparse
+weights from the (deduplicated) nodes onto the target points, built from a
+``cKDTree`` queried with several workers. ``POINT_METHODS``:
+
+  nearest   the nearest node (same result as NearestNDInterpolator)
+  idw       inverse-distance weights of the ``IDW_K`` nearest nodes
+  layer     trilinear weights inside the layer holding the target point;
+            neighbours never cross a layer interface. Layers whose nodes do
+            not form a full x/y/z lattice fall back to IDW within the layer.
+"""
+
+import hashlib, os, threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.spatial import Delaunay, cKDTree
+
+from .graph import code_version
+
+SLICE_TOL = 20.0
+POINT_METHODS = ("nearest", "idw", "layer")
+IDW_K, IDW_POWER = 8, 2.0
+_MISSING = object()
+
+
+class SliceOperator:
+    """
+    Sparse linear interpolation from the nodes of a Mesh onto the regular
+    (depth x axis1) grid of one contour slice.
+
+    rows     : mesh row indices kept after layer resolution
+    weights  : CSR matrix (n_grid, len(rows)) of barycentric weights
+    outside  : bool mask (n_grid,) of grid points outside the convex hull
+    g1, g2   : grid axes (a1 coordinate, Yn_elem)
+    """
+
+    def __init__(self, rows, weights, outside, g1, g2):
+        self.rows = rows
+        self.weights = weights
+        self.outside = outside
+        self.g1 = g1
+        self.g2 = g2
+
+    @property
+    def shape(self):
+        return (len(self.g2), len(self.g1))
+
+    def apply(self, values):
+        """Interpolate one per-node field (len == mesh nodes) onto the grid."""
+        out = self.weights @ np.asarray(values, dtype=float)[self.rows]
+        out[self.outside] = np.nan
+        return out.reshape(self.shape)
+
+    def pick(self, values):
+        """Value of the most heavily weighted node at every grid point (categorical fields)."""
+        out = np.asarray(values, dtype=float)[self.rows][dominant_columns(self.weights)]
+        out[self.outside] = np.nan
+        return out.reshape(self.shape)
+
+    # ── persistence ──────────────────────────────
+    def save(self, path):
+        w = self.weights
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, rows=self.rows, data=w.data, indices=w.indices, indptr=w.indptr,
+                     shape=np.array(w.shape), outside=self.outside, g1=self.g1, g2=self.g2)
+        os.replace(tmp, path)  # atomic, so parallel workers never read a partial file
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            weights = sp.csr_matrix((z["data"], z["indices"], z["indptr"]),
+                                    shape=tuple(z["shape"]))
+            return cls(z["rows"], weights, z["outside"], z["g1"], z["g2"])
+
+
+def slice_axes(plane):
+    """Column names (a1, a2) of a slice plane and the coordinate it is cut along."""
+    if plane == "XY":
+        return "Xn_elem", "Yn_elem", "Zn_elem"
+    return "Zn_elem", "Yn_elem", "Xn_elem"
+
+
+class SliceNodes:
+    """
+    Resolved nodes of one slice: mesh ``rows`` and their in-plane ``pts``
+    (a1, a2). The Delaunay triangulation is built on first use and shared by
+    every grid cut from the slice (LOD levels, focus tiles, frames).
+    """
+
+    def __init__(self, rows, pts):
+        self.rows = rows
+        self.pts = pts
+        self._tri = None
+
+    @property
+    def tri(self):
+        if self._tri is None:
+            self._tri = Delaunay(self.pts)
+        return self._tri
+
+
+def slice_nodes(sec, mesh, plane, coord_val, resolve):
+    """
+    Select the slice and resolve interface duplicates with ``resolve``.
+    Returns None when the slice has fewer than 10 nodes.
+    """
+    a1, a2, cut = slice_axes(plane)
+    coords = {"Xn_elem": mesh.x, "Yn_elem": mesh.y, "Zn_elem": mesh.z}
+    mask = (coords[cut] >= coord_val - SLICE_TOL) & (coords[cut] <= coord_val + SLICE_TOL)
+    if mask.sum() < 10:
+        return None
+    slc = pd.DataFrame({a1: coords[a1][mask], a2: coords[a2][mask],
+                        "_key": mesh.nodes.key(a1, a2)[mask], "_row": np.flatnonzero(mask)})
+    slc = resolve(sec, slc, a1, a2)
+    return SliceNodes(slc["_row"].values, slc[[a1, a2]].values)
+
+
+def slice_grid(pts, grid_res, box=None):
+    """
+    Grid axes (g1, g2) over the slice points ``pts``: uniform along a1 and
+    60/40 split at 600 mm below the top in a2. With ``box`` (a1_lo, a1_hi,
+    a2_lo, a2_hi) the grid is uniform, ``grid_res`` x ``grid_res``, inside
+    that box clipped to the slice.
+    """
+    a1_min, a1_max = pts[:, 0].min(), pts[:, 0].max()
+    a2_min, a2_max = pts[:, 1].min(), pts[:, 1].max()
+    if box is not None:
+        g1 = np.linspace(max(box[0], a1_min), min(box[1], a1_max), grid_res)
+        g2 = np.linspace(min(box[3], a2_max), max(box[2], a2_min), grid_res)
+        return g1, g2
+
+    g1 = np.linspace(a1_min, a1_max, grid_res)
+    g2_upper = np.linspace(a2_max, a2_max - 600, int(grid_res * 0.6))
+    g2_lower = np.linspace(a2_max - 600, a2_min, int(grid_res * 0.4))
+    return g1, np.concatenate([g2_upper, g2_lower[1:]])
+
+
+def build_slice_operator(nodes, grid_res, box=None):
+    """SliceOperator from the SliceNodes ``nodes`` onto the grid of slice_grid."""
+    g1, g2 = slice_grid(nodes.pts, grid_res, box)
+    grid_a1, grid_a2 = np.meshgrid(g1, g2)
+    xi = np.column_stack([grid_a1.ravel(), grid_a2.ravel()])
+    return SliceOperator(nodes.rows, *barycentric_weights(nodes.pts, xi, nodes.tri), g1, g2)
+
+
+def barycentric_weights(pts, xi, tri=None):
+    """Sparse (len(xi), len(pts)) linear-interpolation weights and the outside-hull mask."""
+    tri = tri if tri is not None else Delaunay(pts)
+    simplex = tri.find_simplex(xi)
+    outside = simplex < 0
+    s = np.where(outside, 0, simplex)
+
+    T = tri.transform[s]                                  # (n, 3, 2)
+    b = np.einsum("nij,nj->ni", T[:, :2, :], xi - T[:, 2, :])
+    bary = np.column_stack([b, 1.0 - b.sum(axis=1)])
+    bary[outside] = 0.0
+
+    n = len(xi)
+    weights = sp.csr_matrix(
+        (bary.ravel(), tri.simplices[s].ravel(), np.arange(0, 3 * n + 1, 3)),
+        shape=(n, len(pts)))
+    return weights, outside
+
+
+class PointOperator:
+    """Sparse weights (n_targets, n_nodes) from node values onto 3D target points."""
+
+    def __init__(self, weights):
+        self.weights = weights
+
+    def apply(self, values):
+        return self.weights @ np.asarray(values, dtype=float)
+
+    def pick(self, values):
+        """Value of the most heavily weighted node at every target (categorical fields)."""
+        return np.asarray(values, dtype=float)[dominant_columns(self.weights)]
+
+    def save(self, path):
+        w = self.weights
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, data=w.data, indices=w.indices, indptr=w.indptr, shape=np.array(w.shape))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(sp.csr_matrix((z["data"], z["indices"], z["indptr"]),
+                                     shape=tuple(z["shape"])))
+
+
+def dominant_columns(weights):
+    """Column of the largest weight in every row of CSR ``weights`` (0 for empty rows)."""
+    lens = np.diff(weights.indptr)
+    order = np.lexsort((-weights.data, np.repeat(np.arange(len(lens)), lens)))
+    cols = np.zeros(len(lens), dtype=np.int64)
+    cols[lens > 0] = weights.indices[order[weights.indptr[:-1][lens > 0]]]
+    return cols
+
+
+def _csr(cols, weights, n_cols):
+    """CSR matrix with ``weights[i]`` at columns ``cols[i]`` of row i (both (n, k))."""
+    n, k = cols.shape
+    return sp.csr_matrix((weights.ravel(), cols.ravel(), np.arange(0, n * k + 1, k)),
+                         shape=(n, n_cols))
+
+
+def idw_weights(tree, targets, k=IDW_K, power=IDW_POWER, workers=1):
+    """(cols, weights) of the ``k`` nearest nodes; an exact hit takes all the weight."""
+    k = min(k, tree.n)
+    dist, cols = tree.query(targets, k=k, workers=workers)
+    dist, cols = dist.reshape(len(targets), k), cols.reshape(len(targets), k)
+    with np.errstate(divide="ignore"):
+        w = 1.0 / dist ** power
+    exact = dist[:, 0] == 0
+    w[exact] = 0.0
+    w[exact, 0] = 1.0
+    return cols, w / w.sum(axis=1, keepdims=True)
+
+
+def trilinear_weights(coords, targets):
+    """
+    (cols, weights) of the 8 lattice corners around every target, or None if
+    ``coords`` is not a full x/y/z lattice. Targets are clamped to its box.
+    """
+    axes, index = [], []
+    for d in range(3):
+        u, inv = np.unique(coords[:, d], return_inverse=True)
+        axes.append(u)
+        index.append(inv)
+    if np.prod([len(u) for u in axes]) != len(coords):
+        return None
+    lattice = np.full([len(u) for u in axes], -1)
+    lattice[tuple(index)] = np.arange(len(coords))
+    if (lattice < 0).any():
+        return None
+
+    lo, frac = [], []
+    for d, u in enumerate(axes):
+        t = np.clip(targets[:, d], u[0], u[-1])
+        i = np.clip(np.searchsorted(u, t, side="right") - 1, 0, max(len(u) - 2, 0))
+        width = u[np.minimum(i + 1, len(u) - 1)] - u[i]
+        lo.append(i)
+        frac.append(np.where(width > 0, (t - u[i]) / np.where(width > 0, width, 1.0), 0.0))
+    cols, w = [], []
+    for corner in range(8):
+        bits = [(corner >> d) & 1 for d in range(3)]
+        idx = tuple(np.minimum(lo[d] + bits[d], len(axes[d]) - 1) for d in range(3))
+        cols.append(lattice[idx])
+        w.append(np.prod([frac[d] if bits[d] else 1.0 - frac[d] for d in range(3)], axis=0))
+    return np.column_stack(cols), np.column_stack(w)
+
+
+def layer_of(sec, y):
+    """Layer index of every Yn_elem in ``y``; interface points go to the layer above."""
+    tops = np.array([sec.y_ranges[lay][1] for lay in sec.structure])
+    # tops decrease with the layer index: the layers below y's layer have tops <= y
+    below = np.searchsorted(tops[::-1], y, side="right")
+    return np.clip(len(tops) - 1 - below, 0, len(tops) - 1)
+
+
+def build_point_operator(coords, targets, method="nearest", sec=None, workers=1):
+    """PointOperator from ``coords`` (nodes x 3, x/y/z) onto ``targets`` (n x 3)."""
+    n = len(coords)
+    if method == "nearest":
+        _, cols = cKDTree(coords).query(targets, workers=workers)
+        return PointOperator(_csr(cols[:, None], np.ones((len(targets), 1)), n))
+    if method == "idw":
+        return PointOperator(_csr(*idw_weights(cKDTree(coords), targets, workers=workers), n))
+    if method != "layer":
+        raise ValueError(f"unknown interpolation method {method!r} (one of {POINT_METHODS})")
+
+    # Every layer owns its nodes (interface nodes belong to both neighbours)
+    # and the targets inside it; weights never reach across an interface
+    r, c, v = [], [], []
+    target_layer = layer_of(sec, targets[:, 1])
+    for li, lay in enumerate(sec.structure):
+        rows = np.flatnonzero(target_layer == li)
+        y_lower, y_upper = sec.y_ranges[lay]
+        nodes = np.flatnonzero((coords[:, 1] >= y_lower) & (coords[:, 1] <= y_upper))
+        if len(rows) == 0:
+            continue
+        if len(nodes) == 0:
+            raise ValueError(f"layer {lay} has no nodes to interpolate from")
+        found = trilinear_weights(coords[nodes], targets[rows])
+        if found is None:
+            found = idw_weights(cKDTree(coords[nodes]), targets[rows], workers=workers)
+        cols, w = found
+        r.append(np.repeat(rows, cols.shape[1]))
+        c.append(nodes[cols].ravel())
+        v.append(w.ravel())
+    weights = sp.csr_matrix((np.concatenate(v), (np.concatenate(r), np.concatenate(c))),
+                            shape=(len(targets), n))
+    return PointOperator(weights)
+
+
+class LRUDict(OrderedDict):
+    """Thread-safe dict that keeps the ``maxsize`` most recently used entries."""
+
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = super().__getitem__(key)
+            self.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            while len(self) > self.maxsize:
+                self.popitem(last=False)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class OperatorCache:
+    """
+    Memoizes SliceOperators per (plane, coord, grid, mesh) and
+    PointOperators per (targets, method, mesh). Every grid of one slice is
+    cut from the same SliceNodes, so it is triangulated once. With
+    ``cache_dir`` set, operators are also persisted as .npz files and reused
+    by later runs; their file tags include the code version of the modules
+    that build them (this one and the engine's interface resolver), so an
+    edit there never loads a stale operator. ``maxsize`` bounds the
+    in-memory sets (least recently used dropped).
+    """
+
+    def __init__(self, cache_dir=None, maxsize=None):
+        self.cache_dir = cache_dir
+        self.version = code_version("interp", "engine") if cache_dir else None
+        self._ops = LRUDict(maxsize) if maxsize else {}
+        self._nodes = LRUDict(maxsize) if maxsize else {}
+        self.hits = self.builds = 0
+
+    def _path(self, prefix, key):
+        if not self.cache_dir:
+            return None
+        tag = hashlib.sha1(repr((self.version,) + key).encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{prefix}_{tag}.npz")
+
+    def get(self, sec, mesh, plane, coord_val, grid_res, resolve, box=None):
+        """SliceOperator of the ``grid_res`` grid (inside ``box``, see slice_grid)."""
+        # The layer structure drives interface resolution, so it is part of the key
+        base = (tuple(sec.structure), tuple(sec.thicknesses), plane,
+                round(float(coord_val), 3))
+        key = base + (int(grid_res), mesh.key)
+        if box is not None:
+            key += (tuple(round(float(b), 3) for b in box),)
+        op = self._ops.get(key, _MISSING)
+        if op is not _MISSING:
+            self.hits += 1
+            return op
+
+        path = self._path(f"slice_{plane}_{grid_res}", key)
+        if path:
+            if os.path.exists(path):
+                self.hits += 1
+                op = self._ops[key] = SliceOperator.load(path)
+                return op
+
+        self.builds += 1
+        nodes = self._nodes.get(base + (mesh.key,), _MISSING)
+        if nodes is _MISSING:
+            nodes = self._nodes[base + (mesh.key,)] = slice_nodes(sec, mesh, plane, coord_val, resolve)
+        op = build_slice_operator(nodes, grid_res, box) if nodes is not None else None
+        if op is not None and path:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            op.save(path)
+        self._ops[key] = op
+        return op
+
+    def points(self, sec, mesh, coords, targets, method="nearest", workers=1):
+        """PointOperator from the node ``coords`` of ``mesh`` onto ``targets``."""
+        h = hashlib.sha1(np.ascontiguousarray(targets, dtype=float).tobytes())
+        key = (method, mesh.key, h.hexdigest()[:16],
+               (tuple(sec.structure), tuple(sec.thicknesses)) if method == "layer" else None)
+        op = self._ops.get(key, _MISSING)
+        if op is not _MISSING:
+            self.hits += 1
+            return op
+
+        path = self._path(f"points_{method}", key)
+        if path:
+            if os.path.exists(path):
+                self.hits += 1
+                op = self._ops[key] = PointOperator.load(path)
+                return op
+
+        self.builds += 1
+        op = build_point_operator(coords, targets, method, sec, workers)
+        if path:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            op.save(path)
+        self._ops[key] = op
+        return op
@@ -0,0 +1,288 @@
+"""
+Asphera mesh and field stacks
+=============================
+The FEM mesh does not move between tire positions, so the node geometry
+(``Node``, ``Xn_elem``, ``Yn_elem``, ``Zn_elem``) is stored once per case in a
+``Mesh``; every field is a dense ``(timesteps x nodes)`` float32 array in a
+``CaseData``. Rows are in ``Node`` order throughout. ``iter_case`` streams
+the same data one timestep at a time for bounded-memory runs.
+
+Interface nodes appear once per layer that shares them. ``NodeIndex`` gives
+every row an integer coordinate key so duplicates are found with one
+``np.unique`` per mesh instead of float groupbys per timestep.
+
+The stacks need one node set per case. A timestep whose rows come in a
+different order is realigned to the first one; a timestep meshed
+differently fails the case (the CLI reports it and goes on).
+
+Scenarios of one section run on the same geometry: ``iter_case`` hands out
+the Mesh already loaded in the process (with its indexes built) when the
+geometry hash matches.
+"""
+
+import hashlib, math, os
+import numpy as np
+import pandas as pd
+
+from .interp import LRUDict
+from .store import GEOMETRY_COLUMNS, load_timestep, source_path
+from .trace import span
+
+SHARED_MESHES = 4   # meshes kept per process for the next case on the same geometry
+KEY_RANGE = 2**63   # int64 keys; wider rank products fall back to numbering unique rows
+_MESHES = LRUDict(SHARED_MESHES)
+
+
+class Mesh:
+    """Node geometry shared by every timestep of a case."""
+
+    def __init__(self, node, x, y, z):
+        self.node = np.asarray(node)
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.z = np.asarray(z, dtype=float)
+        self._key = None
+        self._columns = None
+        self._nodes = None
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(*(np.array(df[c].to_numpy()) for c in GEOMETRY_COLUMNS))
+
+    def __len__(self):
+        return len(self.node)
+
+    @property
+    def key(self):
+        """Content hash of the geometry (row order included)."""
+        if self._key is None:
+            h = hashlib.sha1()
+            for arr in (self.node, self.x, self.y, self.z):
+                h.update(np.ascontiguousarray(arr).tobytes())
+            self._key = h.hexdigest()[:16]
+        return self._key
+
+    def matches(self, df):
+        """True if ``df`` has exactly this geometry, row for row."""
+        if len(df) != len(self):
+            return False
+        return all(np.array_equal(df[c].to_numpy(), arr)
+                   for c, arr in zip(GEOMETRY_COLUMNS, (self.node, self.x, self.y, self.z)))
+
+    def align(self, df):
+        """
+        Row order of ``df`` onto this geometry (``df.iloc[order]`` matches it
+        row for row), or None if ``df`` holds a different node set.
+        """
+        if len(df) != len(self):
+            return None
+        mine = (self.node, self.x, self.y, self.z)
+        theirs = tuple(df[c].to_numpy() for c in GEOMETRY_COLUMNS)
+        a, b = np.lexsort(mine[::-1]), np.lexsort(theirs[::-1])
+        if not all(np.array_equal(m[a], t[b]) for m, t in zip(mine, theirs)):
+            return None
+        order = np.empty(len(self), dtype=int)
+        order[a] = b
+        return order
+
+    @property
+    def columns(self):
+        """ColumnIndex of this mesh (built on first use)."""
+        if self._columns is None:
+            self._columns = ColumnIndex(self)
+        return self._columns
+
+    @property
+    def nodes(self):
+        """NodeIndex of this mesh (built on first use)."""
+        if self._nodes is None:
+            self._nodes = NodeIndex(self)
+        return self._nodes
+
+    def frame(self):
+        return pd.DataFrame({"Node": self.node, "Xn_elem": self.x,
+                             "Yn_elem": self.y, "Zn_elem": self.z})
+
+
+def shared_mesh(mesh):
+    """The Mesh of this process with the geometry of ``mesh`` (``mesh`` itself the first time)."""
+    shared = _MESHES.get(mesh.key)
+    if shared is None:
+        shared = _MESHES[mesh.key] = mesh
+    return shared
+
+
+class ColumnIndex:
+    """
+    Vertical node columns of a Mesh: every distinct (Xn_elem, Zn_elem) pair
+    maps to its row indices ordered top-down by Yn_elem, then by Node (the
+    order of a depth profile). Built with one lexsort; a lookup then costs
+    only the column length.
+    """
+
+    def __init__(self, mesh):
+        order = np.lexsort((mesh.node, -mesh.y, mesh.z, mesh.x))
+        xs, zs = mesh.x[order], mesh.z[order]
+        new_col = np.ones(len(order), dtype=bool)
+        new_col[1:] = (xs[1:] != xs[:-1]) | (zs[1:] != zs[:-1])
+        self.order = order
+        self.starts = np.append(np.flatnonzero(new_col), len(order))
+        self.x = xs[new_col]
+        self.z = zs[new_col]
+        self.col_of_row = np.empty(len(order), dtype=np.int64)
+        self.col_of_row[order] = np.cumsum(new_col) - 1
+        self._lookup = {(x, z): c for c, (x, z) in enumerate(zip(self.x.tolist(), self.z.tolist()))}
+        # Rank of each column on the distinct X and Z coordinates, for neighbour queries
+        self._xi = np.unique(self.x, return_inverse=True)[1]
+        self._zi = np.unique(self.z, return_inverse=True)[1]
+
+    def __len__(self):
+        return len(self.x)
+
+    def rows(self, col):
+        """Mesh rows of column ``col``, top-down."""
+        return self.order[self.starts[col]:self.starts[col + 1]]
+
+    def column_at(self, x, z):
+        """Column id at exactly (x, z), or None."""
+        return self._lookup.get((float(x), float(z)))
+
+    def column_of(self, row):
+        return int(self.col_of_row[row])
+
+    def neighbours(self, col, radius=1):
+        """Column ids within ``radius`` grid steps of ``col`` in X and Z (``col`` included)."""
+        near = ((np.abs(self._xi - self._xi[col]) <= radius) &
+                (np.abs(self._zi - self._zi[col]) <= radius))
+        return np.flatnonzero(near)
+
+
+class NodeIndex:
+    """
+    Integer keys of the node coordinates of a Mesh. Every axis is replaced
+    by its rank among its exactly distinct float values, so a coordinate
+    tuple becomes one int64 that sorts like the floats and two rows share a
+    key only if a groupby on the raw coordinates would group them. When the
+    product of the ranks does not fit an int64 the distinct rank tuples are
+    numbered (in the same order) instead.
+    ``inverse`` maps every row onto its distinct (x, y, z) position; those
+    are numbered in (x, y, z) order, like a groupby on the coordinates.
+    """
+
+    def __init__(self, mesh):
+        self._rank = {}
+        for col, arr in zip(GEOMETRY_COLUMNS[1:], (mesh.x, mesh.y, mesh.z)):
+            u, inv = np.unique(arr, return_inverse=True)
+            self._rank[col] = (inv.astype(np.int64), len(u))
+        _, self.first, self.inverse, self.counts = np.unique(
+            self.key(*GEOMETRY_COLUMNS[1:]), return_index=True, return_inverse=True,
+            return_counts=True)
+        self.coords = np.column_stack([mesh.x, mesh.y, mesh.z])[self.first]
+
+    def __len__(self):
+        return len(self.first)
+
+    def key(self, *cols):
+        """int64 key per row of the coordinate columns ``cols`` (e.g. "Xn_elem", "Yn_elem")."""
+        if math.prod(self._rank[col][1] for col in cols) >= KEY_RANGE:
+            ranks = np.column_stack([self._rank[col][0] for col in cols])
+            return np.unique(ranks, axis=0, return_inverse=True)[1].reshape(-1).astype(np.int64)
+        key = np.zeros(len(self._rank[cols[0]][0]), dtype=np.int64)
+        for col in cols:
+            rank, n = self._rank[col]
+            key = key * n + rank
+        return key
+
+    def mean(self, values):
+        """Per-row ``values`` averaged over the rows of every distinct node."""
+        return np.bincount(self.inverse, weights=values, minlength=len(self)) / self.counts
+
+
+class CaseData:
+    """
+    One FEM case: a shared Mesh plus ``fields[name]`` of shape
+    (timesteps, nodes). ``timesteps`` lists the tire positions that were
+    loaded; stack index ``i`` is the i-th loaded file.
+    """
+
+    def __init__(self, mesh, timesteps, fields):
+        self.mesh = mesh
+        self.timesteps = list(timesteps)
+        self.fields = fields
+
+    def __len__(self):
+        return len(self.timesteps)
+
+    def values(self, field, i):
+        """Field ``field`` at stack index ``i`` as float64 (len == nodes)."""
+        return self.fields[field][i].astype(float)
+
+    def frame(self, i, fields=None):
+        """DataFrame with the geometry and ``fields`` (default: all) at stack index ``i``."""
+        df = self.mesh.frame()
+        for f in (self.fields if fields is None else fields):
+            df[f] = self.values(f, i)
+        return df
+
+    @property
+    def nbytes(self):
+        geo = sum(a.nbytes for a in (self.mesh.node, self.mesh.x, self.mesh.y, self.mesh.z))
+        return geo + sum(a.nbytes for a in self.fields.values())
+
+
+def iter_case(source_dir, case, ts_list, columns, cache_dir=None):
+    """
+    Yield (stack index, single-timestep CaseData) for every available
+    timestep of ``case``, one file at a time; all frames share one Mesh.
+    Rows of a timestep listed in another order are realigned to it. Raises
+    ValueError if a tire position has a different node set and
+    FileNotFoundError if no timestep exists.
+    """
+    field_cols = [c for c in columns if c not in GEOMETRY_COLUMNS]
+    mesh, first = None, None
+    i = 0
+    for ts in ts_list:
+        fn = os.path.basename(source_path(source_dir, case, ts))
+        print(f"  Loading {fn} ...")
+        with span("load_file", timestep=ts):
+            df = load_timestep(source_dir, case, ts, GEOMETRY_COLUMNS + field_cols,
+                               cache_dir=cache_dir)
+            if df is None:
+                print(f"  [SKIP] {fn} not found")
+                continue
+            if mesh is None:
+                mesh, first = shared_mesh(Mesh.from_frame(df)), ts
+            elif not mesh.matches(df):
+                order = mesh.align(df)
+                if order is None:
+                    raise ValueError(f"{case}: tire{ts} is meshed differently from tire{first} "
+                                     "(one node set per case is required)")
+                print(f"  [WARN] {fn}: rows reordered to the tire{first} mesh")
+                df = df.iloc[order]
+            # Cached columns are float32 already: views of the memory map, no copy
+            fields = {c: df[c].to_numpy(np.float32, copy=False)[None] for c in field_cols}
+            del df
+        yield i, CaseData(mesh, [ts], fields)
+        i += 1
+    if mesh is None:
+        raise FileNotFoundError(f"{case}: no timesteps found under {source_dir}")
+
+
+def load_case(source_dir, case, ts_list, columns, cache_dir=None):
+    """
+    Load every available timestep of ``case`` into a CaseData, keeping only
+    ``columns``. Raises ValueError if the node set changes between tire
+    positions (the stacks require one shared mesh, see iter_case).
+    """
+    fields, loaded = {}, []
+    for i, frame in iter_case(source_dir, case, ts_list, columns, cache_dir):
+        if not fields:
+            fields = {c: np.empty((len(ts_list), len(frame.mesh)), dtype=np.float32)
+                      for c in frame.fields}
+        for c, arr in frame.fields.items():
+            fields[c][i] = arr[0]
+        loaded.append(frame.timesteps[0])
+        mesh = frame.mesh
+    if len(loaded) < len(ts_list):
+        fields = {c: arr[:len(loaded)].copy() for c, arr in fields.items()}
+    return CaseData(mesh, loaded, fields)
@@ -0,0 +1,371 @@
+"""
+Asphera artifact writers
+========================
+Engine stages return plain dicts whose large numeric arrays are wrapped in
+``Values`` (NumPy array + the decimals it is published with). The writers
+decide how those arrays hit the disk:
+
+  json    <name>.json               nested lists, rounded, NaN -> null
+                                    (streamed from the arrays, see iter_json)
+  binary  <name>.manifest.json      the same document, every Values replaced
+          <name>.bin                by {"$bin": {offset, length, shape, dtype}}
+                                    pointing into one little-endian blob
+
+Binary arrays are Int16 with a 10^-decimals scale when that holds the
+published precision exactly (-32768 marks NaN), Float32 otherwise.
+
+Writing an artifact in one format deletes its files in the other, so a
+folder never holds both; readers take the format from ``structure.json``.
+
+Every file can also get precompressed ``.gz`` / ``.br`` siblings (maximum
+compression) for static hosts that serve them as Content-Encoding; brotli is
+optional (``pip install brotli``). The writers drop the siblings of every
+file they rewrite, so an existing sibling is always current.
+"""
+
+import gzip, json, os
+import numpy as np
+
+from .trace import REPORT_FILE, add_bytes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FORMATS = ("json", "binary")
+ENCODINGS = (".gz", ".br")
+TRANSFER_MBPS = 10.0              # link speed assumed by the transfer-time estimate
+LAYOUTS = ("chunked", "bundle")   # animation frames: separate files or inside contours
+FIELD_DECIMALS = 4      # precision of every published field value
+INT16_NAN = -32768
+
+
+class Values:
+    """A NumPy array published with ``decimals`` digits after the point (0 = integers)."""
+
+    def __init__(self, array, decimals=FIELD_DECIMALS):
+        self.array = np.asarray(array, dtype=float)
+        self.decimals = decimals
+
+    def tolist(self):
+        """Rounded nested lists with None for NaN (the JSON representation)."""
+        d = self.decimals
+        conv = (lambda v: int(round(v))) if d == 0 else (lambda v: round(v, d))
+
+        def rec(seq):
+            return [rec(v) if isinstance(v, list) else (conv(v) if v == v else None) for v in seq]
+        return rec(self.array.tolist())
+
+
+def to_jsonable(obj):
+    """``json.dump`` default hook: Values -> rounded lists."""
+    if isinstance(obj, Values):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def artifact_files(name, fmt):
+    return [f"{name}.json"] if fmt == "json" else [f"{name}.manifest.json", f"{name}.bin"]
+
+
+def write_artifact(out_dir, name, obj, fmt="json", report=True):
+    """
+    Write ``obj`` as ``<out_dir>/<name>.*``; ``name`` may contain subfolders.
+    The files of ``name`` in any other format are removed.
+    """
+    os.makedirs(os.path.dirname(os.path.join(out_dir, name)), exist_ok=True)
+    for other in FORMATS:
+        if other != fmt:
+            remove_artifact(out_dir, name, other)
+    if fmt == "binary":
+        return write_binary(out_dir, name, obj, report)
+    return write_json(os.path.join(out_dir, f"{name}.json"), obj, report)
+
+
+def remove_artifact(out_dir, name, fmt):
+    """Delete the ``fmt`` files of ``name`` and their precompressed variants."""
+    for fn in artifact_files(name, fmt):
+        path = os.path.join(out_dir, fn)
+        if os.path.exists(path):
+            os.remove(path)
+        remove_encoded(path)
+
+
+def remove_encoded(path):
+    """Delete the precompressed variants of ``path``."""
+    for ext in ENCODINGS:
+        if os.path.exists(path + ext):
+            os.remove(path + ext)
+
+
+def artifact_format(case_dir):
+    """Format of the contours and point cloud of a case folder (its structure.json)."""
+    with open(os.path.join(case_dir, "structure.json")) as f:
+        return json.load(f).get("format", "json")
+
+
+def write_json(path, obj, report=True):
+    remove_encoded(path)
+    with open(path, "w") as f:
+        for chunk in iter_json(obj):
+            f.write(chunk)
+    add_bytes(os.path.getsize(path))
+    if report:
+        _report(path)
+    return path
+
+
+# ──────────────────────────────────────────────────────
+#  STREAMING JSON
+# ──────────────────────────────────────────────────────
+# Same bytes as json.dump(obj, separators=(",", ":"), default=to_jsonable),
+# but every Values array is rounded and formatted by NumPy a block of rows at
+# a time instead of becoming one Python float per element.
+CHUNK_VALUES = 1 << 13
+
+
+def round_decimals(arr, decimals):
+    """``np.round`` that agrees with Python's correctly rounded ``round()``."""
+    out = np.round(arr, decimals)
+    scaled = np.abs(arr) * 10.0 ** decimals
+    # np.round scales by 10^d in floating point, which can flip values sitting
+    # on a rounding boundary; redo those (and huge magnitudes) in Python
+    risky = (np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6) | (scaled >= 2.0 ** 52)
+    for i in np.flatnonzero(risky):
+        out.flat[i] = round(float(arr.flat[i]), decimals)
+    return out
+
+
+def format_values(arr, decimals):
+    """Array of JSON number strings ("null" for NaN), same text as repr(round(v, d))."""
+    arr = np.asarray(arr, dtype=float)
+    gaps = np.isnan(arr)
+    if decimals == 0:
+        text = np.rint(np.where(gaps, 0.0, arr)).astype(np.int64).astype(str)
+    else:
+        text = round_decimals(arr, decimals).astype(str)
+    return np.where(gaps, "null", text) if gaps.any() else text
+
+
+def iter_values(arr, decimals):
+    if arr.ndim == 1:
+        yield "["
+        for start in range(0, len(arr), CHUNK_VALUES):
+            yield ("," if start else "") + ",".join(
+                format_values(arr[start:start + CHUNK_VALUES], decimals).tolist())
+        yield "]"
+    elif arr.ndim == 2:
+        yield "["
+        step = max(1, CHUNK_VALUES // max(1, arr.shape[1]))
+        for start in range(0, len(arr), step):
+            block = format_values(arr[start:start + step], decimals)
+            yield ("," if start else "") + ",".join("[" + ",".join(row) + "]" for row in block.tolist())
+        yield "]"
+    else:
+        yield "["
+        for i, sub in enumerate(arr):
+            if i:
+                yield ","
+            yield from iter_values(sub, decimals)
+        yield "]"
+
+
+def iter_json(obj):
+    """Compact JSON text of ``obj`` in chunks; Values arrays are never listified."""
+    if isinstance(obj, Values):
+        yield from iter_values(obj.array, obj.decimals)
+    elif isinstance(obj, dict):
+        yield "{"
+        for i, (k, v) in enumerate(obj.items()):
+            yield ("," if i else "") + json.dumps(str(k)) + ":"
+            yield from iter_json(v)
+        yield "}"
+    elif isinstance(obj, (list, tuple)) and any(isinstance(v, (dict, list, tuple, Values)) for v in obj):
+        yield "["
+        for i, v in enumerate(obj):
+            if i:
+                yield ","
+            yield from iter_json(v)
+        yield "]"
+    else:
+        yield json.dumps(obj, separators=(",", ":"))
+
+
+# ──────────────────────────────────────────────────────
+#  BINARY
+# ──────────────────────────────────────────────────────
+def encode_array(arr, decimals):
+    """(bytes, ref) for one array: Int16 when exact at ``decimals``, else Float32."""
+    arr = np.asarray(arr, dtype=float)
+    finite = ~np.isnan(arr)
+    if decimals is not None:
+        scaled = np.round(arr[finite] * 10.0 ** decimals)
+        if not len(scaled) or np.abs(scaled).max() < -INT16_NAN:
+            q = np.full(arr.shape, INT16_NAN, dtype="<i2")
+            q[finite] = scaled
+            return q.tobytes(), {"dtype": "int16", "scale": 10.0 ** -decimals,
+                                 "length": arr.size, "shape": list(arr.shape)}
+        arr = np.where(finite, np.round(arr, decimals), np.nan)
+    return arr.astype("<f4").tobytes(), {"dtype": "float32", "length": arr.size,
+                                         "shape": list(arr.shape)}
+
+
+def write_binary(out_dir, name, obj, report=True):
+    blobs, offset = [], 0
+
+    def pack(node):
+        nonlocal offset
+        if isinstance(node, Values):
+            data, ref = encode_array(node.array, node.decimals)
+            pad = -offset % 4                          # typed-array views need aligned offsets
+            blobs.append(b"\0" * pad + data)
+            offset += pad
+            ref["offset"] = offset
+            offset += len(data)
+            return {"$bin": ref}
+        if isinstance(node, dict):
+            return {k: pack(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [pack(v) for v in node]
+        return node
+
+    manifest = pack(obj)
+    # The blob sits next to its manifest
+    manifest["$binary"] = {"file": f"{os.path.basename(name)}.bin", "byteLength": offset,
+                           "littleEndian": True}
+    bin_path = os.path.join(out_dir, f"{name}.bin")
+    man_path = os.path.join(out_dir, f"{name}.manifest.json")
+    remove_encoded(bin_path)
+    remove_encoded(man_path)
+    with open(bin_path, "wb") as f:
+        for b in blobs:
+            f.write(b)
+    with open(man_path, "w") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    add_bytes(offset + os.path.getsize(man_path))
+    if report:
+        _report(man_path)
+        _report(bin_path)
+    return man_path
+
+
+def read_artifact(out_dir, name, fmt=None):
+    """
+    Read ``<out_dir>/<name>`` back in format ``fmt`` (default: the one
+    recorded in ``<out_dir>/structure.json``). Binary arrays come back as
+    float NumPy arrays (NaN for gaps); JSON arrays stay lists (null for gaps).
+    """
+    if (fmt or artifact_format(out_dir)) == "json":
+        with open(os.path.join(out_dir, f"{name}.json")) as f:
+            return json.load(f)
+    with open(os.path.join(out_dir, f"{name}.manifest.json")) as f:
+        manifest = json.load(f)
+    with open(os.path.join(os.path.dirname(os.path.join(out_dir, name)),
+                           manifest.pop("$binary")["file"]), "rb") as f:
+        blob = f.read()
+
+    def unpack(node):
+        if isinstance(node, dict) and "$bin" in node:
+            ref = node["$bin"]
+            if ref["dtype"] == "int16":
+                q = np.frombuffer(blob, "<i2", ref["length"], ref["offset"])
+                arr = np.where(q == INT16_NAN, np.nan, q * ref["scale"])
+            else:
+                arr = np.frombuffer(blob, "<f4", ref["length"], ref["offset"]).astype(float)
+            return arr.reshape(ref["shape"])
+        if isinstance(node, dict):
+            return {k: unpack(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [unpack(v) for v in node]
+        return node
+    return unpack(manifest)
+
+
+def _report(path):
+    name = os.path.basename(path)
+    sz = os.path.getsize(path)
+    print(f"  [OK] {name} ({sz/1024:.1f} KB)" if sz < 1024*1024
+          else f"  [OK] {name} ({sz/1024/1024:.1f} MB)")
+
+
+# ──────────────────────────────────────────────────────
+#  PRECOMPRESSION + SIZE REPORT
+# ──────────────────────────────────────────────────────
+def _compress(data, ext):
+    if ext == ".gz":
+        return gzip.compress(data, compresslevel=9, mtime=0)   # mtime=0: reproducible bytes
+    return brotli.compress(data, quality=11)
+
+
+def precompress(path):
+    """
+    Write ``path``.gz and ``path``.br (brotli installed) unless present; the
+    writers remove them whenever ``path`` is rewritten.
+    """
+    data = None
+    for ext in ENCODINGS:
+        if ext == ".br" and brotli is None:
+            continue
+        dst = path + ext
+        if os.path.exists(dst):
+            continue
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        with open(dst, "wb") as f:
+            add_bytes(f.write(_compress(data, ext)))
+
+
+def artifact_paths(out_dir):
+    """Every served file under ``out_dir`` (compressed variants and run reports excluded)."""
+    for root, dirs, files in os.walk(out_dir):
+        dirs.sort()
+        for fn in sorted(files):
+            if fn.endswith((".json", ".bin")) and not fn.startswith(REPORT_FILE[:-5]):
+                yield os.path.join(root, fn)
+
+
+def precompress_all(out_dir):
+    for fp in artifact_paths(out_dir):
+        precompress(fp)
+
+
+def _size(path):
+    return os.path.getsize(path) if os.path.exists(path) else None
+
+
+def _fmt_size(sz):
+    if sz is None:
+        return "-"
+    return f"{sz/1024:.1f} KB" if sz < 1024*1024 else f"{sz/1024/1024:.1f} MB"
+
+
+def size_report(out_dir, mbps=TRANSFER_MBPS):
+    """
+    Raw / gzip / brotli size of every artifact (the frames/ folder summed as
+    one row), transfer time at ``mbps`` raw and with the smallest encoding.
+    """
+    rows = {}
+    for fp in artifact_paths(out_dir):
+        rel = os.path.relpath(fp, out_dir).replace(os.sep, "/")
+        label = rel.split("/")[0] + "/" if "/" in rel else rel
+        row = rows.setdefault(label, {"files": 0, "raw": 0, ".gz": 0, ".br": 0})
+        row["files"] += 1
+        row["raw"] += os.path.getsize(fp)
+        for ext in ENCODINGS:
+            sz = _size(fp + ext)
+            row[ext] = None if sz is None or row[ext] is None else row[ext] + sz
+    secs = lambda n: n * 8 / (mbps * 1e6)
+    print(f"\n  {'Output files:':<26s}{'raw':>11s}{'gzip':>11s}{'brotli':>11s}"
+          f"   @{mbps:g} Mbit/s (raw -> best)")
+    for label, row in rows.items():
+        name = f"{label} ({row['files']} files)" if row["files"] > 1 else label
+        best = min(((row[e], e) for e in ENCODINGS if row[e] is not None), default=(row["raw"], ""))
+        best = best if best[0] < row["raw"] else (row["raw"], "")
+        print(f"    {name:<24s}{_fmt_size(row['raw']):>11s}{_fmt_size(row['.gz']):>11s}"
+              f"{_fmt_size(row['.br']):>11s}   {secs(row['raw']):6.2f} s -> "
+              f"{secs(best[0]):5.2f} s {best[1] or 'raw'}")
+    if brotli is None:
+        print("    (brotli not installed: no .br variants)")
+    return rows
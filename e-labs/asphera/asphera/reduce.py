@@ -0,0 +1,152 @@
+"""
+Asphera cross-timestep reductions
+=================================
+``CriticalTable`` holds, for every layer and profile component, the
+per-timestep max/min and the mesh row where each occurs. It is computed in
+one vectorized pass over the (timesteps x nodes) stacks; every entry of
+``PROFILE_DEFS`` is then answered by a lookup instead of re-filtering every
+timestep. Streamed runs apply the same rule one timestep at a time through
+``is_more_critical``.
+
+``Envelope`` is the same reduction per node instead of per layer: the
+max/min of every field over all tire positions and the timestep of each.
+"""
+
+import numpy as np
+
+from .config import TSTEP_RANGE, IGNORE_SURFACE
+
+MAX_COMPONENTS = ("E11", "E33")   # tensile: critical = largest value
+MIN_COMPONENTS = ("E22",)         # compressive: critical = smallest value
+# everything else (shear, ...) : critical = largest magnitude
+ENVELOPE_KINDS = ("max", "min", "abs")
+
+
+def layer_mask(sec, mesh, det_layer):
+    """Nodes of ``det_layer`` (AC1 excludes the top IGNORE_SURFACE mm)."""
+    y_lo, y_hi = sec.y_ranges[det_layer]
+    if det_layer == "AC1":
+        y_hi = y_hi - IGNORE_SURFACE
+    return (mesh.y >= y_lo) & (mesh.y <= y_hi)
+
+
+def is_more_critical(component, value, best):
+    """True if ``value`` beats ``best`` for ``component`` (ties keep the earlier one)."""
+    if component in MAX_COMPONENTS:
+        return value > best
+    if component in MIN_COMPONENTS:
+        return value < best
+    return abs(value) > abs(best)
+
+
+class CriticalTable:
+    """
+    stats[(layer, component)] = dict of (timesteps,) arrays:
+      max, argmax, min, argmin    (arg* are mesh row indices)
+    """
+
+    def __init__(self, stats, n_timesteps):
+        self.stats = stats
+        self.n_timesteps = n_timesteps
+
+    @classmethod
+    def build(cls, sec, data, components):
+        layer_rows = {lay: np.flatnonzero(layer_mask(sec, data.mesh, lay)) for lay in sec.structure}
+        t = np.arange(len(data))
+        stats = {}
+        for comp in dict.fromkeys(components):
+            stack = data.fields[comp]
+            for lay, rows in layer_rows.items():
+                if len(rows) == 0:
+                    continue
+                block = stack[:, rows]                       # (timesteps, layer nodes)
+                imax, imin = block.argmax(axis=1), block.argmin(axis=1)
+                stats[(lay, comp)] = {
+                    "max": block[t, imax].astype(float), "argmax": rows[imax],
+                    "min": block[t, imin].astype(float), "argmin": rows[imin],
+                }
+        return cls(stats, len(data))
+
+    def extreme(self, component, det_layer):
+        """Per-timestep critical value and mesh row for ``component`` in ``det_layer``."""
+        key = (det_layer, component)
+        if key not in self.stats:
+            raise ValueError(f"layer {det_layer} has no nodes (or {component} was not reduced)")
+        s = self.stats[key]
+        if component in MAX_COMPONENTS:
+            return s["max"], s["argmax"]
+        if component in MIN_COMPONENTS:
+            return s["min"], s["argmin"]
+        use_max = np.abs(s["max"]) >= np.abs(s["min"])
+        return np.where(use_max, s["max"], s["min"]), np.where(use_max, s["argmax"], s["argmin"])
+
+    def critical(self, component, det_layer):
+        """
+        Critical (stack index, value, mesh row) over TSTEP_RANGE. The earliest
+        timestep wins ties, matching the original per-timestep loop.
+        """
+        start = TSTEP_RANGE[0] - 1
+        end   = min(TSTEP_RANGE[1], self.n_timesteps)
+        vals, rows = self.extreme(component, det_layer)
+        window = vals[start:end]
+        if component in MAX_COMPONENTS:
+            k = int(np.argmax(window))
+        elif component in MIN_COMPONENTS:
+            k = int(np.argmin(window))
+        else:
+            k = int(np.argmax(np.abs(window)))
+        return start + k, float(window[k]), int(rows[start + k])
+
+
+class Envelope:
+    """
+    Per mesh row, for every field over TSTEP_RANGE:
+      max, argmax, min, argmin    (arg* are stack indices)
+    With ``per_node`` every timestep is first averaged over the rows of each
+    distinct node (mesh.nodes), as the point cloud does, and the arrays are
+    per node instead. ``build`` reduces the (timesteps x nodes) stacks in
+    one pass; streamed runs fold one timestep at a time into ``update``. Ties
+    keep the earliest timestep either way.
+    """
+
+    def __init__(self, fields, per_node=False):
+        self.fields = list(dict.fromkeys(fields))
+        self.per_node = per_node
+        self.stats = {}
+
+    @classmethod
+    def build(cls, data, fields, per_node=False):
+        env = cls(fields, per_node)
+        start, end = TSTEP_RANGE[0] - 1, min(TSTEP_RANGE[1], len(data))
+        for f in env.fields:
+            block = data.fields[f][start:end]                # (timesteps, nodes)
+            if per_node:
+                block = np.stack([data.mesh.nodes.mean(v) for v in block.astype(float)])
+            imax, imin = block.argmax(axis=0), block.argmin(axis=0)
+            cols = np.arange(block.shape[1])
+            env.stats[f] = {"max": block[imax, cols].astype(float), "argmax": start + imax,
+                            "min": block[imin, cols].astype(float), "argmin": start + imin}
+        return env
+
+    def update(self, frame, i):
+        """Fold in the single-timestep CaseData ``frame`` at stack index ``i``."""
+        for f in self.fields:
+            v = frame.values(f, 0)
+            if self.per_node:
+                v = frame.mesh.nodes.mean(v)
+            s = self.stats.get(f)
+            if s is None:
+                self.stats[f] = {"max": v, "argmax": np.full(len(v), i),
+                                 "min": v.copy(), "argmin": np.full(len(v), i)}
+                continue
+            for kind, better in (("max", v > s["max"]), ("min", v < s["min"])):
+                s[kind][better] = v[better]
+                s["arg" + kind][better] = i
+
+    def extreme(self, field, kind):
+        """(values, stack indices) of ``kind`` (one of ENVELOPE_KINDS)."""
+        s = self.stats[field]
+        if kind != "abs":
+            return s[kind], s["arg" + kind]
+        use_max = np.abs(s["max"]) >= np.abs(s["min"])
+        return np.where(use_max, s["max"], s["min"]), np.where(use_max, s["argmax"], s["argmin"])
@@ -0,0 +1,437 @@
+"""
+Asphera query server
+====================
+Serves a local viewer from the same processed data, plus results the static
+files cannot hold: a slice at any plane coordinate, the depth profile at any
+(x, z), the time history at any point and per-layer statistics. Case stacks
+are loaded on first use (from the columnar cache when one is given) and kept
+in memory; slice/point operators and encoded results sit in LRU caches, so a
+repeated query is a dictionary lookup.
+
+  GET /api/cases                                     served cases and their timesteps
+  GET /api/<ID>/slice?plane=XY&coord=0&ts=10         contour slice at the nearest node plane
+                                                     (fields=, res=)
+  GET /api/<ID>/profile?x=0&z=0&component=E22        depth profile (ts=, critical if omitted)
+  GET /api/<ID>/history?x=0&z=0&depth=100            point time history (fields=, method=)
+  GET /api/<ID>/layers?field=E22                     per-layer min/max/mean (ts=, window if omitted)
+  GET /api/status                                    cache statistics
+  GET /data/<ID>/<file>                              processed files (.gz variant when accepted)
+
+``<ID>`` is the case folder name under the output directory. x and z are
+centered like the published axes; depth is measured from the surface (mm).
+Queries run on a thread pool; identical requests in flight share one result.
+
+Usage:
+  python -m asphera.server --source D:/FEM --cache ./.cache
+  python -m asphera.server TK_P1 --port 8765 --workers 4
+  # then open index.html?server=http://localhost:8765
+"""
+
+import argparse, asyncio, gzip, json, mimetypes, os, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+import numpy as np
+
+from .config import (CACHE_DIR, CONTOUR_FIELDS, MODEL_DEPTH, OUTPUT_DIR, SOURCE_DIR, TSTEP_RANGE,
+                     available_sections, load_section)
+from .engine import (axis_centers, extract_contour_slice, field_unit,
+                     needed_columns, profile_at)
+from .interp import POINT_METHODS, LRUDict, OperatorCache
+from .mesh import load_case
+from .output import Values, iter_json
+from .reduce import MAX_COMPONENTS, MIN_COMPONENTS
+
+DEFAULT_PORT = 8765
+GZIP_MIN_BYTES = 1024     # smaller bodies are sent as is
+
+
+class QueryError(ValueError):
+    """Bad query parameters (HTTP 400)."""
+
+
+class NotFound(LookupError):
+    """Unknown case, query or file (HTTP 404)."""
+
+
+def most_critical(component, values):
+    """Flat index of the critical entry of ``values``; the first one wins ties."""
+    if component in MAX_COMPONENTS:
+        return int(np.argmax(values))
+    if component in MIN_COMPONENTS:
+        return int(np.argmin(values))
+    return int(np.argmax(np.abs(values)))
+
+
+# ──────────────────────────────────────────────────────
+#  CASES
+# ──────────────────────────────────────────────────────
+class Case:
+    """A loaded case: its section, CaseData and published axis centers."""
+
+    def __init__(self, sec, data):
+        self.sec = sec
+        self.data = data
+        self.x_center, self.z_center = axis_centers(data.mesh)
+        self._planes = {}
+
+    def planes(self, plane):
+        """Distinct node coordinates across an XY (Z) or YZ (X) slice."""
+        if plane not in self._planes:
+            mesh = self.data.mesh
+            self._planes[plane] = np.unique(mesh.z if plane == "XY" else mesh.x)
+        return self._planes[plane]
+
+    def stack_index(self, ts):
+        """Stack index of tire position ``ts``."""
+        try:
+            return self.data.timesteps.index(int(ts))
+        except ValueError:
+            raise QueryError(f"timestep {ts} not loaded (have {self.data.timesteps})") from None
+
+    def window(self):
+        """Stack indices of TSTEP_RANGE."""
+        return range(TSTEP_RANGE[0] - 1, min(TSTEP_RANGE[1], len(self.data)))
+
+    def target(self, x, z, depth=None):
+        """Mesh coordinates of a centered (x, z) and depth from the surface."""
+        pt = [x + self.x_center, z + self.z_center]
+        return pt if depth is None else [pt[0], MODEL_DEPTH - depth, pt[1]]
+
+
+class CaseStore:
+    """Cases of the given sections by id; at most ``max_cases`` stay loaded."""
+
+    def __init__(self, section_ids, source_dir, output_dir, cache_dir=None, max_cases=4):
+        self.source_dir, self.output_dir, self.cache_dir = source_dir, output_dir, cache_dir
+        self.specs = {}
+        for sid in section_ids:
+            sec = load_section(sid)
+            for s in sec.scenarios:
+                self.specs[s["id"]] = (sec, s["case"], s["timesteps"])
+        self._loaded = LRUDict(max_cases)
+        self._lock = threading.Lock()
+
+    def __getitem__(self, case_id):
+        case = self._loaded.get(case_id)
+        if case is not None:
+            return case
+        if case_id not in self.specs:
+            raise NotFound(case_id)
+        with self._lock:                      # one load at a time, each case once
+            case = self._loaded.get(case_id)
+            if case is None:
+                sec, name, ts_list = self.specs[case_id]
+                print(f"  Loading {name} ...")
+                data = load_case(self.source_dir, name, ts_list, needed_columns(sec),
+                                 cache_dir=self.cache_dir)
+                case = self._loaded[case_id] = Case(sec, data)
+        return case
+
+    def listing(self):
+        return [{"id": cid, "section": sec.id, "case": case, "timesteps": ts_list,
+                 "loaded": cid in self._loaded}
+                for cid, (sec, case, ts_list) in self.specs.items()]
+
+
+# ──────────────────────────────────────────────────────
+#  QUERIES
+# ──────────────────────────────────────────────────────
+def _param(query, name, conv=float, default=None):
+    vals = query.get(name)
+    if not vals:
+        if default is None:
+            raise QueryError(f"missing parameter {name!r}")
+        return default
+    try:
+        return conv(vals[0])
+    except ValueError:
+        raise QueryError(f"bad value for {name!r}: {vals[0]!r}") from None
+
+
+def _fields(query, default):
+    fields = _param(query, "fields", lambda s: s.split(","), default)
+    unknown = [f for f in fields if f not in CONTOUR_FIELDS]
+    if unknown:
+        raise QueryError(f"unknown field(s) {', '.join(unknown)} (one of {CONTOUR_FIELDS})")
+    return fields
+
+
+def _field(case, query, name):
+    field = _param(query, name, str)
+    if field not in case.data.fields:
+        raise QueryError(f"unknown field {field!r} (one of {sorted(case.data.fields)})")
+    return field
+
+
+def query_slice(case, query, ops):
+    """Contour slice of ``plane`` at the centered ``coord`` (Z for XY, X for YZ)."""
+    plane = _param(query, "plane", str, "XY")
+    if plane not in ("XY", "YZ"):
+        raise QueryError("plane must be XY or YZ")
+    coord = _param(query, "coord", float, 0.0)
+    ts_idx = case.stack_index(_param(query, "ts", int))
+    res = _param(query, "res", int, 80)
+    if not 8 <= res <= 400:
+        raise QueryError("res must be within 8..400")
+    center = case.z_center if plane == "XY" else case.x_center
+    # Slices cut through node planes: snap to the nearest one
+    planes = case.planes(plane)
+    coord = float(planes[np.argmin(np.abs(planes - (coord + center)))])
+    result = extract_contour_slice(case.sec, case.data, ts_idx, plane, coord,
+                                   _fields(query, CONTOUR_FIELDS), res, x_center=case.x_center,
+                                   z_center=case.z_center, ops=ops)
+    if result is None:
+        raise QueryError(f"no nodes on the {plane} plane at {coord - center:.1f}")
+    return {"plane": plane, "coord": round(coord - center, 2),
+            "timestep": case.data.timesteps[ts_idx], **result}
+
+
+def query_profile(case, query, ops):
+    """Depth profile through the node column nearest to (x, z)."""
+    data, cols = case.data, case.data.mesh.columns
+    comp = _field(case, query, "component")
+    x, z = case.target(_param(query, "x"), _param(query, "z"))
+    col = int(np.argmin((cols.x - x) ** 2 + (cols.z - z) ** 2))
+    rows = cols.rows(col)
+    if "ts" in query:
+        ts_idx = case.stack_index(_param(query, "ts", int))
+        crit = rows[most_critical(comp, data.fields[comp][ts_idx, rows])]
+    else:
+        # Critical entry of the column over the animation window
+        window = np.asarray(case.window())
+        k = most_critical(comp, data.fields[comp][window][:, rows])
+        ts_idx, crit = int(window[k // len(rows)]), rows[k % len(rows)]
+    result = profile_at(data, comp, ts_idx, crit, data.timesteps[ts_idx])
+    return {"component": comp, "x": round(float(cols.x[col] - case.x_center), 2),
+            "z": round(float(cols.z[col] - case.z_center), 2), **result}
+
+
+def query_history(case, query, ops):
+    """Every loaded timestep of ``fields`` at one point, interpolated with ``method``."""
+    x, z, depth = _param(query, "x"), _param(query, "z"), _param(query, "depth")
+    method = _param(query, "method", str, "nearest")
+    if method not in POINT_METHODS:
+        raise QueryError(f"method must be one of {POINT_METHODS}")
+    nodes = case.data.mesh.nodes
+    target = np.array([case.target(x, z, depth)])
+    op = ops.points(case.sec, case.data.mesh, nodes.coords, target, method)
+    w = op.weights
+    # Only the rows of the few weighted nodes are read, across all timesteps
+    node_rows = [np.flatnonzero(nodes.inverse == c) for c in w.indices]
+    result = {"x": x, "z": z, "depth": depth, "method": method,
+              "timesteps": case.data.timesteps, "fields": {}}
+    for field in _fields(query, CONTOUR_FIELDS):
+        stack = case.data.fields[field]
+        series = sum(wi * stack[:, rows].astype(float).mean(axis=1)
+                     for wi, rows in zip(w.data, node_rows))
+        scale, unit = field_unit(field)
+        result["fields"][field] = {"values": Values(series * scale), "unit": unit}
+    return result
+
+
+def query_layers(case, query, ops):
+    """Per-layer min/max/mean of ``field`` and where its critical value sits."""
+    data, mesh, sec = case.data, case.data.mesh, case.sec
+    field = _field(case, query, "field")
+    steps = ([case.stack_index(_param(query, "ts", int))] if "ts" in query
+             else list(case.window()))
+    scale, unit = field_unit(field)
+    layers = []
+    for lay, label in zip(sec.structure, sec.labels):
+        y_lo, y_hi = sec.y_ranges[lay]
+        rows = np.flatnonzero((mesh.y >= y_lo) & (mesh.y <= y_hi))
+        entry = {"id": lay, "label": label, "nodes": len(rows)}
+        if len(rows):
+            block = data.fields[field][steps][:, rows].astype(float) * scale
+            k = most_critical(field, block)
+            row = rows[k % len(rows)]
+            entry.update({
+                "min": round(float(block.min()), 4), "max": round(float(block.max()), 4),
+                "mean": round(float(block.mean()), 4),
+                "critical": {"value": round(float(block.flat[k]), 4),
+                             "timestep": data.timesteps[steps[k // len(rows)]],
+                             "x": round(float(mesh.x[row] - case.x_center), 2),
+                             "depth": round(float(MODEL_DEPTH - mesh.y[row]), 2),
+                             "z": round(float(mesh.z[row] - case.z_center), 2)}})
+        layers.append(entry)
+    return {"field": field, "unit": unit, "timesteps": [data.timesteps[i] for i in steps],
+            "layers": layers}
+
+
+QUERIES = {"slice": query_slice, "profile": query_profile,
+           "history": query_history, "layers": query_layers}
+
+
+# ──────────────────────────────────────────────────────
+#  HTTP
+# ──────────────────────────────────────────────────────
+class QueryServer:
+    """Minimal HTTP/1.1 server (GET, keep-alive, CORS) over a CaseStore."""
+
+    def __init__(self, store, workers=4, max_results=256, max_operators=64):
+        self.store = store
+        self.ops = OperatorCache(maxsize=max_operators)
+        self.results = LRUDict(max_results)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.pending = {}
+        self.requests = self.result_hits = 0
+
+    def compute(self, case_id, kind, query):
+        """Encoded JSON result of one query (runs on the thread pool)."""
+        result = QUERIES[kind](self.store[case_id], query, self.ops)
+        return "".join(iter_json(result)).encode()
+
+    async def api(self, parts, query):
+        if parts == ["cases"]:
+            return json.dumps({"cases": self.store.listing()}).encode()
+        if parts == ["status"]:
+            return json.dumps({"requests": self.requests, "resultHits": self.result_hits,
+                               "results": len(self.results), "operatorHits": self.ops.hits,
+                               "operatorBuilds": self.ops.builds,
+                               "cases": self.store.listing()}).encode()
+        if len(parts) != 2 or parts[1] not in QUERIES or parts[0] not in self.store.specs:
+            raise NotFound("/".join(parts))
+        key = ("/".join(parts), tuple(sorted((k, tuple(v)) for k, v in query.items())))
+        body = self.results.get(key)
+        if body is not None:
+            self.result_hits += 1
+            return body
+        fut = self.pending.get(key)
+        if fut is None:
+            fut = self.pending[key] = asyncio.get_running_loop().run_in_executor(
+                self.pool, self.compute, parts[0], parts[1], query)
+            fut.add_done_callback(lambda _: self.pending.pop(key, None))
+        body = await fut
+        self.results[key] = body
+        return body
+
+    def static(self, rel, headers):
+        """(body, headers) of a processed file under the output folder."""
+        root = os.path.abspath(self.store.output_dir)
+        path = os.path.abspath(os.path.join(root, rel))
+        if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+            raise NotFound(rel)
+        ctype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        extra = {}
+        if ("gzip" in headers.get("accept-encoding", "") and os.path.isfile(path + ".gz")
+                and os.path.getmtime(path + ".gz") >= os.path.getmtime(path)):
+            path, extra = path + ".gz", {"Content-Encoding": "gzip"}
+        with open(path, "rb") as f:
+            return f.read(), ctype, extra
+
+    async def respond(self, method, target, headers):
+        """(status, body, content type, extra headers) of one request."""
+        if method == "OPTIONS":
+            return 204, b"", None, {"Access-Control-Allow-Methods": "GET, OPTIONS",
+                                    "Access-Control-Allow-Headers": "*"}
+        if method not in ("GET", "HEAD"):
+            return 405, b"method not allowed", "text/plain", {}
+        url = urlsplit(target)
+        path, query = unquote(url.path), parse_qs(url.query)
+        self.requests += 1
+        try:
+            if path.startswith("/data/"):
+                return (200, *await asyncio.get_running_loop().run_in_executor(
+                    self.pool, self.static, path[len("/data/"):], headers))
+            if path.startswith("/api/"):
+                body = await self.api(path[len("/api/"):].strip("/").split("/"), query)
+                extra = {}
+                if "gzip" in headers.get("accept-encoding", "") and len(body) >= GZIP_MIN_BYTES:
+                    body, extra = gzip.compress(body, 5), {"Content-Encoding": "gzip"}
+                return 200, body, "application/json", extra
+        except QueryError as exc:
+            return 400, json.dumps({"error": str(exc)}).encode(), "application/json", {}
+        except NotFound as exc:
+            return 404, json.dumps({"error": f"not found: {exc}"}).encode(), "application/json", {}
+        except Exception as exc:
+            print(f"  [FAIL] {target}: {exc!r}")
+            return 500, json.dumps({"error": repr(exc)}).encode(), "application/json", {}
+        return 404, json.dumps({"error": f"not found: {path}"}).encode(), "application/json", {}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                t0 = time.perf_counter()
+                status, body, ctype, extra = await self.respond(method, target, headers)
+                keep = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+                        "Access-Control-Allow-Origin: *",
+                        f"Content-Length: {len(body)}",
+                        f"Connection: {'keep-alive' if keep else 'close'}",
+                        f"Server-Timing: total;dur={(time.perf_counter() - t0) * 1000:.1f}"]
+                if ctype:
+                    head.append(f"Content-Type: {ctype}")
+                head += [f"{k}: {v}" for k, v in extra.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Asphera query server on http://{host}:{port} "
+              f"({len(self.store.specs)} case(s), {self.pool._max_workers} worker(s))")
+        async with server:
+            await server.serve_forever()
+
+
+_REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m asphera.server",
+                                 description="Serve on-demand Asphera slices, profiles and probes.")
+    ap.add_argument("sections", nargs="*",
+                    help=f"section ids to serve (default: all of {', '.join(available_sections())})")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--source", default=SOURCE_DIR,
+                    help="folder holding <CASE>/<CASE>_3DResponse_tire<ts>.pkl.bz2 files")
+    ap.add_argument("--output", default=OUTPUT_DIR, help="processed data folder served under /data")
+    ap.add_argument("--cache", default=CACHE_DIR, help="columnar cache the cases are loaded from")
+    ap.add_argument("--no-cache", dest="cache", action="store_const", const=None,
+                    help="read the pkl.bz2 sources directly")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                    help="query threads (default: CPU count)")
+    ap.add_argument("--max-cases", type=int, default=4, help="cases kept in memory")
+    ap.add_argument("--max-results", type=int, default=256, help="encoded results kept in memory")
+    ap.add_argument("--max-operators", type=int, default=64,
+                    help="slice/point operators kept in memory")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = CaseStore(args.sections or available_sections(), args.source, args.output,
+                      args.cache, args.max_cases)
+    server = QueryServer(store, args.workers, args.max_results, args.max_operators)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n[DONE] Server stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
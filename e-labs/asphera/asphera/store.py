@@ -0,0 +1,121 @@
+"""
+Asphera columnar timestep store
+===============================
+Decompressing whole ``*_3DResponse_tire{ts}.pkl.bz2`` DataFrames dominates
+startup. Each source file is converted once into one ``.npy`` file per
+column (rows already sorted by ``Node``) plus a ``meta.json`` recording the
+source size, mtime and SHA-1 and the version of this module. Later runs
+memory-map only the columns they ask for. Field columns are stored as
+float32, the precision of the CaseData stacks, so they are used without a
+copy; the geometry keeps float64 for the exact coordinate keys.
+
+Layout:
+  <cache>/columns/<CASE>/tire<ts>/meta.json
+  <cache>/columns/<CASE>/tire<ts>/<column>.npy
+"""
+
+import hashlib, json, os, shutil
+import numpy as np
+import pandas as pd
+
+from .graph import code_version
+
+GEOMETRY_COLUMNS = ["Node", "Xn_elem", "Yn_elem", "Zn_elem"]
+
+
+def source_path(source_dir, case, ts):
+    return os.path.join(source_dir, case, f"{case}_3DResponse_tire{ts}.pkl.bz2")
+
+
+def file_sha1(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _read_source(fp):
+    df = pd.read_pickle(fp, compression="bz2")
+    return df.sort_values(by="Node", ascending=True).reset_index(drop=True)
+
+
+def _is_fresh(entry_dir, fp):
+    """True if the cached columns were converted from the current ``fp``."""
+    meta_fp = os.path.join(entry_dir, "meta.json")
+    if not os.path.exists(meta_fp):
+        return False
+    with open(meta_fp) as f:
+        meta = json.load(f)
+    if meta.get("code") != code_version("store"):
+        return False
+    stat = _stat_key(fp)
+    if meta["size"] == stat["size"] and meta["mtime_ns"] == stat["mtime_ns"]:
+        return True
+    # Touched or copied but same bytes: refresh the stat key and keep the columns
+    if meta["size"] == stat["size"] and meta["sha1"] == file_sha1(fp):
+        meta.update(stat)
+        with open(meta_fp, "w") as f:
+            json.dump(meta, f, indent=1)
+        return True
+    return False
+
+
+def convert(fp, entry_dir):
+    """Convert one pkl.bz2 source into the columnar layout. Returns the full frame."""
+    df = _read_source(fp)
+    tmp = f"{entry_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    columns = {}
+    for col in df.columns:
+        arr = df[col].to_numpy()
+        if arr.dtype == object:
+            continue  # only numeric columns are memory-mappable
+        if col not in GEOMETRY_COLUMNS and arr.dtype.kind == "f":
+            arr = arr.astype(np.float32)
+        np.save(os.path.join(tmp, f"{col}.npy"), np.ascontiguousarray(arr))
+        columns[col] = arr.dtype.str
+    meta = {"source": os.path.basename(fp), **_stat_key(fp), "sha1": file_sha1(fp),
+            "code": code_version("store"), "rows": len(df), "columns": columns}
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=1)
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.replace(tmp, entry_dir)
+    return df
+
+
+def load_timestep(source_dir, case, ts, columns=None, cache_dir=None):
+    """
+    Load one timestep as a DataFrame sorted by ``Node`` with only ``columns``
+    (all columns if None). With ``cache_dir`` set, the columns are
+    memory-mapped from the columnar cache (field columns as float32),
+    converting the source first if the cache is missing or stale. Returns
+    None if the source file is missing.
+    """
+    fp = source_path(source_dir, case, ts)
+    if not os.path.exists(fp):
+        return None
+    if not cache_dir:
+        df = _read_source(fp)
+        return df if columns is None else df[list(columns)]
+
+    entry_dir = os.path.join(cache_dir, "columns", case, f"tire{ts}")
+    if not _is_fresh(entry_dir, fp):
+        print(f"  Converting {os.path.basename(fp)} to columnar cache ...")
+        df = convert(fp, entry_dir)
+        return df if columns is None else df[list(columns)]
+
+    with open(os.path.join(entry_dir, "meta.json")) as f:
+        available = json.load(f)["columns"]
+    columns = list(available) if columns is None else list(columns)
+    missing = [c for c in columns if c not in available]
+    if missing:
+        raise KeyError(f"{case} tire{ts}: columns {missing} not in source")
+    data = {c: np.load(os.path.join(entry_dir, f"{c}.npy"), mmap_mode="r") for c in columns}
+    return pd.DataFrame(data, copy=False)
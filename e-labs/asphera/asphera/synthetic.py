@@ -0,0 +1,115 @@
+"""
+Asphera synthetic FEM data
+==========================
+Writes ``<CASE>/<CASE>_3DResponse_tire{ts}.pkl.bz2`` files with the schema of
+the real post-processing output, so the pipeline can be run and benchmarked
+without the proprietary results:
+
+  Node, Xn_elem, Yn_elem, Zn_elem           layered mesh of the section
+  E11, E22, E33, E12, E13, E23, U2, SMises  moving single-tire load pattern
+
+Every layer gets ``per_layer`` node levels (denser towards its top) on an
+``nx`` x ``nz`` plan grid; interface levels are duplicated in the two layers
+that share them, as in the FEM export. Rows are shuffled like the real files.
+
+Usage:
+  python -m asphera.synthetic OUT_DIR                  # all sections
+  python -m asphera.synthetic OUT_DIR TK_P1 --nx 81 --nz 61 --per-layer 10
+"""
+
+import argparse, os, sys
+import numpy as np
+import pandas as pd
+
+from .config import (MODEL_DEPTH, MODEL_LENGTH, MODEL_WIDTH, WHEEL_LENGTH, WHEEL_WIDTH,
+                     available_sections, load_section)
+from .store import source_path
+
+SIZES = {            # nx, nz, per_layer
+    "small":  (21, 15, 4),
+    "medium": (41, 31, 6),
+    "large":  (81, 61, 10),
+}
+
+
+def mesh_nodes(sec, nx=31, nz=21, per_layer=6):
+    """(node, x, y, z) arrays of a layered mesh following ``sec.thicknesses``."""
+    xs = np.linspace(0.0, MODEL_LENGTH, nx)
+    zs = np.linspace(0.0, MODEL_WIDTH, nz)
+    grading = np.linspace(0.0, 1.0, per_layer) ** 1.5   # 0 = layer top
+    blocks, top = [], MODEL_DEPTH
+    for thick in sec.thicknesses:
+        X, Y, Z = np.meshgrid(xs, top - thick * grading, zs, indexing="ij")
+        blocks.append(np.column_stack([X.ravel(), Y.ravel(), Z.ravel()]))
+        top -= thick
+    xyz = np.vstack(blocks)
+    return np.arange(1, len(xyz) + 1), xyz[:, 0], xyz[:, 1], xyz[:, 2]
+
+
+def tire_position(ts, n_ts):
+    """Tire center X at timestep ``ts`` of ``n_ts``: crosses the model center mid-run."""
+    return MODEL_LENGTH / 2 + (ts - (n_ts + 1) / 2) * WHEEL_LENGTH / 4
+
+
+def synthetic_timestep(sec, nodes, ts, n_ts, seed=0):
+    """DataFrame of one tire position on the mesh ``nodes`` (see mesh_nodes)."""
+    node, x, y, z = nodes
+    rng = np.random.default_rng(seed * 1000 + ts)
+    depth = MODEL_DEPTH - y
+    ac = sum(t for lay, t in zip(sec.structure, sec.thicknesses) if lay.startswith("AC"))
+    dx = (x - tire_position(ts, n_ts)) / WHEEL_LENGTH
+    dz = (z - MODEL_WIDTH / 2) / (4 * WHEEL_WIDTH)
+    # Response peaks when the tire is over the model center (the instrumented section)
+    amp = 0.7 + 0.3 * np.exp(-((ts - (n_ts + 1) / 2) / (n_ts / 4)) ** 2)
+    load = amp * np.exp(-dx**2 - dz**2) * np.exp(-depth / 600.0)
+    bend = np.clip(depth / max(ac, 1.0), 0.0, 2.0) - 0.5     # compression on top, tension below
+    noise = lambda scale: rng.normal(0.0, scale, len(node))
+    df = pd.DataFrame({"Node": node.astype(np.int64), "Xn_elem": x, "Yn_elem": y, "Zn_elem": z})
+    df["E11"] = 2e-4 * load * bend + noise(1e-7)
+    df["E22"] = -3e-4 * load + noise(1e-7)
+    df["E33"] = 1.5e-4 * load * bend + noise(1e-7)
+    df["E12"] = -1e-4 * load * dx + noise(1e-7)
+    df["E13"] = -8e-5 * load * dx * dz + noise(1e-7)
+    df["E23"] = -1e-4 * load * dz + noise(1e-7)
+    df["U2"]  = -0.6 * load * np.exp(-depth / 2000.0)
+    df["SMises"] = 0.9 * load + np.abs(noise(1e-3))
+    return df.sample(frac=1.0, random_state=ts).reset_index(drop=True)
+
+
+def write_case(sec, case, out_dir, nx=31, nz=21, per_layer=6, ts_list=None, seed=0):
+    """Write every timestep of ``case``; returns the number of mesh nodes."""
+    ts_list = ts_list or sec.cases[case]
+    nodes = mesh_nodes(sec, nx, nz, per_layer)
+    os.makedirs(os.path.join(out_dir, case), exist_ok=True)
+    for ts in ts_list:
+        df = synthetic_timestep(sec, nodes, ts, len(ts_list), seed)
+        df.to_pickle(source_path(out_dir, case, ts), compression="bz2")
+    return len(nodes[0])
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m asphera.synthetic",
+                                 description="Write synthetic FEM pkl.bz2 files for Asphera.")
+    ap.add_argument("out", help="source folder to create (pass it to --source)")
+    ap.add_argument("sections", nargs="*", help="section ids (default: all)")
+    ap.add_argument("--size", choices=SIZES, default=None, help="preset mesh size")
+    ap.add_argument("--nx", type=int, default=31, help="nodes along X (traffic)")
+    ap.add_argument("--nz", type=int, default=21, help="nodes along Z (transverse)")
+    ap.add_argument("--per-layer", type=int, default=6, help="node levels per layer")
+    ap.add_argument("--seed", type=int, default=0)
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    nx, nz, per_layer = SIZES[args.size] if args.size else (args.nx, args.nz, args.per_layer)
+    for sid in args.sections or available_sections():
+        sec = load_section(sid)
+        for case, ts_list in sec.cases.items():
+            n = write_case(sec, case, args.out, nx, nz, per_layer, ts_list, args.seed)
+            print(f"  [OK] {case}: {len(ts_list)} timesteps x {n} nodes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
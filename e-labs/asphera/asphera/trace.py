@@ -0,0 +1,151 @@
+"""
+Asphera run instrumentation
+===========================
+``span(name, **attrs)`` wraps one block of the pipeline and records its wall
+time, CPU time, growth of the process peak RSS and the bytes written inside
+it (writers call ``add_bytes``). Spans nest into a tree; ``Tracer.write``
+saves the tree of one case plus per-name totals as ``run_report.json``.
+
+Outside of ``Tracer.activate()`` a span is a no-op, so library functions are
+instrumented unconditionally. Peak RSS comes from ``resource`` and is None on
+platforms without it (Windows).
+"""
+
+import contextlib, json, os, sys, time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPORT_FILE = "run_report.json"
+
+_active = None
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024   # Linux reports KiB
+
+
+class Span:
+    __slots__ = ("name", "attrs", "children", "wall", "cpu", "rss", "bytes")
+
+    def __init__(self, name, attrs):
+        self.name, self.attrs, self.children = name, attrs, []
+        self.wall = self.cpu = 0.0
+        self.rss = None
+        self.bytes = 0
+
+    def to_dict(self):
+        d = {"name": self.name, **({"attrs": self.attrs} if self.attrs else {}),
+             "wall": round(self.wall, 6), "cpu": round(self.cpu, 6)}
+        if self.rss is not None:
+            d["rssDeltaMB"] = round(self.rss / 1024 / 1024, 3)
+        if self.bytes:
+            d["bytes"] = self.bytes
+        if self.children:
+            d["children"] = [c.to_dict() for c in self.children]
+        return d
+
+
+class Tracer:
+    """Span tree of one run; ``activate()`` routes ``span`` calls to it."""
+
+    def __init__(self, name="run", **attrs):
+        self.root = Span(name, attrs)
+        self._stack = [self.root]
+
+    @contextlib.contextmanager
+    def activate(self):
+        global _active
+        prev, _active = _active, self
+        try:
+            with _measure(self.root):
+                yield self
+        finally:
+            _active = prev
+
+    def totals(self):
+        """{span name: {count, wall, cpu, bytes}} summed over the tree (root excluded)."""
+        out = {}
+
+        def walk(span):
+            for c in span.children:
+                t = out.setdefault(c.name, {"count": 0, "wall": 0.0, "cpu": 0.0, "bytes": 0})
+                t["count"] += 1
+                t["wall"] += c.wall
+                t["cpu"] += c.cpu
+                t["bytes"] += c.bytes
+                walk(c)
+        walk(self.root)
+        return {k: {**v, "wall": round(v["wall"], 6), "cpu": round(v["cpu"], 6)}
+                for k, v in out.items()}
+
+    def write(self, path, **meta):
+        """Write the report to ``path``; an existing one is kept as ``*.prev.json``."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.replace(path, path.replace(".json", ".prev.json"))
+        rss = peak_rss()
+        report = {**meta, "finished": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                  "wall": round(self.root.wall, 6), "cpu": round(self.root.cpu, 6),
+                  "peakRSSMB": round(rss / 1024 / 1024, 1) if rss is not None else None,
+                  "bytes": self.root.bytes, "totals": self.totals(),
+                  "spans": self.root.to_dict()}
+        with open(path, "w") as f:
+            json.dump(report, f, indent=1)
+        return report
+
+
+@contextlib.contextmanager
+def _measure(s):
+    w0, c0, r0 = time.perf_counter(), time.process_time(), peak_rss()
+    try:
+        yield s
+    finally:
+        s.wall = time.perf_counter() - w0
+        s.cpu = time.process_time() - c0
+        if r0 is not None:
+            s.rss = peak_rss() - r0
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Record the enclosed block as a child of the current span (no-op when inactive)."""
+    tracer = _active
+    if tracer is None:
+        yield None
+        return
+    s = Span(name, attrs)
+    tracer._stack[-1].children.append(s)
+    tracer._stack.append(s)
+    try:
+        with _measure(s):
+            yield s
+    finally:
+        tracer._stack.pop()
+
+
+def add_bytes(n):
+    """Count ``n`` written bytes towards every open span."""
+    if _active is not None:
+        for s in _active._stack:
+            s.bytes += n
+
+
+def compare(report, prev, top=8):
+    """Lines comparing the slowest span totals of two reports."""
+    rows = sorted(report["totals"].items(), key=lambda kv: -kv[1]["wall"])[:top]
+    lines = []
+    for name, t in rows:
+        old = prev.get("totals", {}).get(name) if prev else None
+        delta = (f"  ({(t['wall'] - old['wall']) / old['wall']:+.0%} vs previous)"
+                 if old and old["wall"] > 0 else "")
+        lines.append(f"    {name:<15s}{t['count']:>5d} x {t['wall']:8.3f} s wall "
+                     f"{t['cpu']:8.3f} s cpu{delta}")
+    return lines
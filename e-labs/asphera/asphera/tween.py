@@ -0,0 +1,161 @@
+"""
+Asphera animation in-betweening
+===============================
+The FEM only solves the tire positions of TSTEP_RANGE, so the animation
+jumps a fraction of a footprint per frame. ``upsample_view`` adds
+``factor - 1`` synthetic frames between every pair of neighbouring frames,
+working on the slice grids that are already interpolated (no return to the
+mesh):
+
+  - the longitudinal view (axis1 = X, the traffic direction) estimates the
+    shift ``s`` (grid cells) that best carries frame t onto frame t+1,
+    searched in ``SHIFT_STEP`` cell steps up to ``MAX_SHIFT`` of the width
+    over all fields at once;
+  - the frame at fraction ``a`` is ``(1-a) * A(x - a*s) + a * B(x + (1-a)*s)``,
+    i.e. both neighbours are moved to the intermediate load position and
+    blended. The transverse view (X is normal to the plane) is only blended.
+
+Every interior real frame is also rebuilt from its two neighbours (a
+held-out frame, interval doubled); its error against the real frame,
+relative to the field peak, is the reported accuracy, next to that of a
+plain blend.
+"""
+
+import numpy as np
+
+from .output import Values
+
+MAX_SHIFT = 0.25    # fraction of the grid width
+SHIFT_STEP = 0.25   # grid cells
+
+
+def _stack(frames):
+    """(frames, fields, ny, nx) array and the field names of an animation view."""
+    def grid(values):
+        return values.array if isinstance(values, Values) else np.array(values, dtype=float)
+
+    fields = list(frames[0]["fields"])
+    stack = np.stack([np.stack([grid(f["fields"][fld]["values"]) for fld in fields])
+                      for f in frames])
+    return stack, fields
+
+
+def _gather(values, s):
+    """(left, right, weight) neighbours of ``values`` (..., nx) shifted by ``s`` cells."""
+    nx = values.shape[-1]
+    pos = np.clip(np.arange(nx) - np.asarray(s, dtype=float)[..., None], 0, nx - 1)
+    i0 = np.floor(pos).astype(int)
+    w = pos - i0
+    i1 = np.minimum(i0 + 1, nx - 1)
+    if pos.ndim == 1:               # one shift for everything: plain column gather
+        v0, v1 = values[..., i0], values[..., i1]
+    else:
+        lead = (1,) * (values.ndim - pos.ndim)
+        i0, i1, w = (a.reshape(lead + a.shape) for a in (i0, i1, w))
+        v0, v1 = np.take_along_axis(values, i0, -1), np.take_along_axis(values, i1, -1)
+    return v0, v1, w
+
+
+def shift(values, s):
+    """
+    ``values`` (..., nx) moved by ``s`` cells along the last axis (linear,
+    edges clamped); ``s`` broadcasts over the leading axes.
+    """
+    v0, v1, w = _gather(values, s)
+    out = np.nan_to_num(v0) * (1 - w) + np.nan_to_num(v1) * w
+    # NaN (outside the mesh) only where a NaN neighbour actually carries weight
+    return np.where((np.isnan(v0) & (w < 1)) | (np.isnan(v1) & (w > 0)), np.nan, out)
+
+
+def estimate_shifts(a, b, scale):
+    """
+    Shift (cells) of every pair ``a[p]`` -> ``b[p]`` (both (pairs, fields,
+    ny, nx)), from the mean squared difference of the fields divided by
+    ``scale`` (fields,): whole cells first, then ``SHIFT_STEP`` around the
+    best one. Cells outside the mesh count as zero.
+    """
+    a = np.nan_to_num(a / scale[:, None, None])
+    b = np.nan_to_num(b / scale[:, None, None])
+
+    def best(candidates):
+        """Lowest-cost row of ``candidates`` (k, pairs) for every pair."""
+        cost = np.empty(candidates.shape)
+        for k, s in enumerate(candidates):
+            v0, v1, w = _gather(a, s[:, None, None])
+            cost[k] = ((v0 * (1 - w) + v1 * w - b) ** 2).reshape(len(a), -1).mean(axis=1)
+        return candidates[np.argmin(cost, axis=0), np.arange(len(a))]
+
+    limit = max(1, round(MAX_SHIFT * a.shape[-1]))
+    coarse = best(np.repeat(np.arange(-limit, limit + 1, dtype=float)[:, None], len(a), axis=1))
+    return best(coarse + np.arange(-1 + SHIFT_STEP, 1, SHIFT_STEP)[:, None])
+
+
+def blend(a, b, frac, s):
+    """
+    Frames at ``frac`` (pairs,) between ``a`` and ``b`` (pairs, fields, ny,
+    nx), whose load positions are ``s`` (pairs,) cells apart.
+    """
+    frac = np.asarray(frac, dtype=float)[:, None, None]
+    s = np.asarray(s, dtype=float)[:, None, None]
+    fa, fb = shift(a, frac * s), shift(b, -(1 - frac) * s)
+    frac = frac[..., None]
+    out = (1 - frac) * fa + frac * fb
+    out = np.where(np.isnan(fa), fb, np.where(np.isnan(fb), fa, out))
+    return np.where(np.isnan(a) & np.isnan(b), np.nan, out)
+
+
+def _errors(pred, real, scale):
+    """Per-field (relative RMS, max abs error) of ``pred`` against ``real``."""
+    d = (pred - real).swapaxes(0, 1).reshape(len(scale), -1)
+    rms = np.sqrt(np.nanmean(d ** 2, axis=1)) / scale
+    return rms, np.nanmax(np.abs(d), axis=1)
+
+
+def upsample_view(view, factor, along_x):
+    """
+    Replace the frames of an animation view ({"axis1", "depths", "frames"})
+    by ``factor`` frames per interval (the real ones keep their timestep,
+    synthetic ones get fractional timesteps). ``along_x`` enables the shift
+    estimation. Returns (view, stats) with stats = {"factor", "shifts",
+    "heldOut": {field: {"rms", "maxError", "blendRms"}}}; rms values are
+    relative to the field peak.
+    """
+    frames = view["frames"]
+    stats = {"factor": factor, "shifts": [], "heldOut": {}}
+    if factor <= 1 or len(frames) < 2:
+        return view, stats
+    stack, fields = _stack(frames)
+    scale = np.nanmax(np.abs(stack), axis=(0, 2, 3))
+    scale = np.where(scale > 0, scale, 1.0)
+    shifts = (estimate_shifts(stack[:-1], stack[1:], scale) if along_x
+              else np.zeros(len(frames) - 1))
+    stats["shifts"] = [round(float(s), 2) for s in shifts]
+
+    # Held-out accuracy: every interior frame predicted from its two neighbours
+    if len(frames) >= 3:
+        a, b, real = stack[:-2], stack[2:], stack[1:-1]
+        s2 = estimate_shifts(a, b, scale) if along_x else np.zeros(len(a))
+        rms, max_err = _errors(blend(a, b, np.full(len(a), 0.5), s2), real, scale)
+        blend_rms, _ = _errors(0.5 * (a + b), real, scale)
+        stats["heldOut"] = {f: {"rms": float(rms[i]), "maxError": float(max_err[i]),
+                                "blendRms": float(blend_rms[i])} for i, f in enumerate(fields)}
+
+    # All synthetic frames at once: pair p, fraction k/factor
+    k = np.arange(1, factor)
+    pair = np.repeat(np.arange(len(frames) - 1), len(k))
+    frac = np.tile(k / factor, len(frames) - 1)
+    synth = blend(stack[pair], stack[pair + 1], frac, shifts[pair])
+
+    units = {f: frames[0]["fields"][f]["unit"] for f in fields}
+    out = []
+    for p, fr in enumerate(frames[:-1]):
+        out.append(fr)
+        t0, t1 = fr["timestep"], frames[p + 1]["timestep"]
+        for j, kk in enumerate(k):
+            grid = synth[p * len(k) + j]
+            ts = round(float(t0 + (t1 - t0) * kk / factor), 3)
+            out.append({"timestep": int(ts) if ts.is_integer() else ts,
+                        "fields": {f: {"values": Values(grid[i]), "unit": units[f]}
+                                   for i, f in enumerate(fields)}})
+    out.append(frames[-1])
+    return {**view, "frames": out}, stats
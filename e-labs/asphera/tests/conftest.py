@@ -0,0 +1,53 @@
+"""
+Shared test fixtures
+====================
+A small synthetic FEM case (see asphera.synthetic) written once per session,
+and ``run_case`` to process it into a fresh folder with given options (run
+reports without a cache go to a temp folder under tmp_path).
+"""
+
+import os, tempfile
+import pytest
+
+from asphera.config import load_section
+from asphera.engine import case_output_dir, process_case
+from asphera.synthetic import write_case
+
+SECTION = "TK_P1"
+MESH = dict(nx=13, nz=9, per_layer=3)
+
+
+@pytest.fixture(scope="session")
+def synthetic_case(tmp_path_factory):
+    """(section, case, timesteps, source dir) of a small synthetic TK_P1 case."""
+    sec = load_section(SECTION)
+    case, ts_list = next(iter(sec.cases.items()))
+    source = str(tmp_path_factory.mktemp("source"))
+    write_case(sec, case, source, ts_list=ts_list, **MESH)
+    return sec, case, ts_list, source
+
+
+@pytest.fixture
+def run_case(synthetic_case, tmp_path, monkeypatch):
+    """``run_case(out_name, **options)`` -> case output folder under tmp_path."""
+    sec, case, ts_list, source = synthetic_case
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "tmp"))
+
+    def run(out_name="out", **options):
+        options.setdefault("precompress", False)
+        output_dir = os.path.join(str(tmp_path), out_name)
+        process_case(sec, case, ts_list, source, output_dir, **options)
+        return case_output_dir(case, output_dir)
+    return run
+
+
+def tree(root, skip=()):
+    """{relative path: bytes} of every file under ``root`` except ``skip`` names."""
+    files = {}
+    for base, _, names in os.walk(root):
+        for fn in names:
+            if fn not in skip:
+                path = os.path.join(base, fn)
+                with open(path, "rb") as f:
+                    files[os.path.relpath(path, root)] = f.read()
+    return files
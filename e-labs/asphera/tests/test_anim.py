@@ -0,0 +1,84 @@
+"""
+Animation delta encoding
+========================
+Decoded frames stay within the error bound of the plain frames, and NaN
+gaps (outside the mesh) survive the delta chain, for absolute and relative
+bounds, in memory, through JSON and through a processed case.
+"""
+
+import json, os
+import numpy as np
+import pytest
+
+from asphera.anim import decode_animation, encode_animation, parse_error_bound
+from asphera.output import Values, iter_json
+
+BOUNDS = ["0.5", "0.02", "1%", "0.1%"]
+
+
+def plain_view(seed=0, frames=9):
+    """Moving bump on a (12, 20) grid; some cells leave and re-enter the mesh."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(-1.0, 1.0, 20)
+    out = []
+    for t in range(frames):
+        grid = 300.0 * np.exp(-((x - 0.2 * t + 0.8) / 0.3) ** 2)[None] * np.linspace(1, 0.1, 12)[:, None]
+        grid = grid + rng.normal(0.0, 2.0, grid.shape)
+        grid[:2, :3] = np.nan                               # always outside
+        grid[5, (2 * t) % 20] = np.nan                      # a gap that moves
+        if t in (3, 4):
+            grid[8:, 10:] = np.nan                          # a block that comes back
+        out.append({"timestep": t + 4, "fields": {
+            "E11": {"values": Values(grid), "unit": "ue"},
+            "U2": {"values": Values(grid * -1e-3), "unit": "mm"}}})
+    return {"axis1": list(x), "depths": list(range(12)), "frames": out}
+
+
+def field_stack(view, field):
+    return np.stack([np.asarray(f["fields"][field]["values"].array
+                                if isinstance(f["fields"][field]["values"], Values)
+                                else f["fields"][field]["values"], dtype=float)
+                     for f in view["frames"]])
+
+
+def bound_of(text, stack):
+    kind, value = parse_error_bound(text)
+    return value * np.nanmax(np.abs(stack)) if kind == "rel" else value
+
+
+def check(decoded, plain, text, slack=0.0):
+    assert [f["timestep"] for f in decoded["frames"]] == [f["timestep"] for f in plain["frames"]]
+    for field in plain["frames"][0]["fields"]:
+        ref, got = field_stack(plain, field), field_stack(decoded, field)
+        np.testing.assert_array_equal(np.isnan(got), np.isnan(ref))
+        assert np.nanmax(np.abs(got - ref)) <= bound_of(text, ref) * (1 + 1e-9) + slack
+
+
+@pytest.mark.parametrize("text", BOUNDS)
+def test_round_trip_within_bound(text):
+    view = plain_view()
+    encoded, stats = encode_animation(view, parse_error_bound(text))
+    check(decode_animation(encoded), view, text)
+    for field, st in stats.items():
+        assert st["maxError"] <= st["errorBound"] * (1 + 1e-9)
+
+
+@pytest.mark.parametrize("text", BOUNDS)
+def test_round_trip_through_json(text):
+    view = plain_view(seed=2)
+    encoded, _ = encode_animation(view, parse_error_bound(text))
+    check(decode_animation(json.loads("".join(iter_json(encoded)))), view, text)
+
+
+@pytest.mark.parametrize("text", ["0.5", "1%"])
+def test_processed_case_within_bound(run_case, text):
+    plain_dir = run_case("plain", layout="bundle")
+    delta_dir = run_case("delta", layout="bundle", anim_error=parse_error_bound(text))
+    with open(os.path.join(plain_dir, "contours.json")) as f:
+        plain = json.load(f)["animation"]
+    with open(os.path.join(delta_dir, "contours.json")) as f:
+        delta = json.load(f)["animation"]
+    for key in ("longitudinal", "transverse"):
+        assert delta[key]["encoding"] == "delta"
+        # The plain frames are published at 4 decimals
+        check(decode_animation(delta[key]), plain[key], text, slack=5e-5)
@@ -0,0 +1,195 @@
+"""
+Equivalence with the original pandas/griddata implementations
+==============================================================
+The lexsort interface resolution, the cached SliceOperator and the
+NodeIndex replaced code that was known to produce the published data. Each
+is checked here against a copy of the code it replaced, on a synthetic
+layered mesh whose interface nodes appear once per layer (with different
+values) plus extra exact and near-duplicate coordinates.
+
+Run from ``e-labs/asphera/`` with ``python -m pytest -q``.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.interpolate import griddata
+
+from asphera.config import CONTOUR_FIELDS, MODEL_DEPTH, load_section
+from asphera.engine import extract_contour_slice, field_unit, resolve_contour_slice_by_layers
+from asphera.interp import SLICE_TOL, OperatorCache, build_slice_operator, slice_axes, slice_nodes
+from asphera import mesh as mesh_module
+from asphera.mesh import CaseData, Mesh, NodeIndex
+from asphera.synthetic import mesh_nodes, synthetic_timestep
+
+SECTIONS = ["TK_P1", "FD_P1"]
+GEOMETRY = ["Xn_elem", "Yn_elem", "Zn_elem"]
+
+
+# ──────────────────────────────────────────────────────
+#  BASELINE IMPLEMENTATIONS (as they were replaced)
+# ──────────────────────────────────────────────────────
+def baseline_resolve(sec, slc, a1, a2):
+    y_col = a2
+    layers_dfs = []
+    for i, lay in enumerate(sec.structure):
+        y_lower, y_upper = sec.y_ranges[lay]
+        dfl = slc[slc[y_col].between(y_lower, y_upper)]
+        if dfl.empty:
+            continue
+        if i == 0:
+            dedup = dfl.drop_duplicates(subset=[a1, a2], keep="first")
+        elif i == len(sec.structure) - 1:
+            dedup = dfl.drop_duplicates(subset=[a1, a2], keep="last")
+        else:
+            interior = dfl[(dfl[y_col] > y_lower) & (dfl[y_col] < y_upper)]
+            df_int_high = dfl[dfl[y_col] == y_upper].drop_duplicates(subset=[a1, a2], keep="last")
+            df_int_low = dfl[dfl[y_col] == y_lower].drop_duplicates(subset=[a1, a2], keep="first")
+            dedup = pd.concat([interior, df_int_low, df_int_high], ignore_index=True)
+        layers_dfs.append(dedup)
+    combined = pd.concat(layers_dfs, ignore_index=True)
+    return combined.drop_duplicates(subset=[a1, a2], keep="first")
+
+
+def baseline_slice(sec, df, plane, coord_val, field, g1, g2):
+    a1, a2, cut = slice_axes(plane)
+    slc = df[df[cut].between(coord_val - SLICE_TOL, coord_val + SLICE_TOL)]
+    slc = baseline_resolve(sec, slc, a1, a2)
+    grid_a1, grid_a2 = np.meshgrid(g1, g2)
+    return griddata(slc[[a1, a2]].values, slc[field].values, (grid_a1, grid_a2), method="linear")
+
+
+# ──────────────────────────────────────────────────────
+#  FIXTURES
+# ──────────────────────────────────────────────────────
+def case_frame(sec, seed=0):
+    """
+    One synthetic timestep (rows shuffled) with extra rows: exact duplicates
+    of interior and interface nodes carrying other values, and nodes moved
+    by less than a micrometre.
+    """
+    df = synthetic_timestep(sec, mesh_nodes(sec, nx=17, nz=13, per_layer=4), 5, 9, seed)
+    rng = np.random.default_rng(seed)
+    dup = df.iloc[rng.choice(len(df), 300, replace=False)].copy()
+    dup[CONTOUR_FIELDS] *= rng.uniform(0.5, 1.5, (len(dup), 1))
+    near = df.iloc[rng.choice(len(df), 50, replace=False)].copy()
+    near["Xn_elem"] += 1e-9
+    df = pd.concat([df, dup, near], ignore_index=True)
+    df["Node"] = np.arange(1, len(df) + 1)
+    df = df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+    # The stacks hold float32 fields; give the baseline the same numbers
+    for f in CONTOUR_FIELDS:
+        df[f] = df[f].astype(np.float32).astype(float)
+    return df
+
+
+def case_data(df):
+    mesh = Mesh(*(df[c].to_numpy() for c in ["Node"] + GEOMETRY))
+    return CaseData(mesh, [5], {f: df[f].to_numpy(np.float32)[None] for f in CONTOUR_FIELDS})
+
+
+def slice_coord(df, plane):
+    """A cut through existing node lines, near the middle of the model."""
+    cut = slice_axes(plane)[2]
+    values = np.unique(df[cut])
+    return float(values[len(values) // 2])
+
+
+# ──────────────────────────────────────────────────────
+#  TESTS
+# ──────────────────────────────────────────────────────
+@pytest.mark.parametrize("sid", SECTIONS)
+@pytest.mark.parametrize("plane", ["XY", "YZ"])
+def test_resolve_matches_groupby_version(sid, plane):
+    sec = load_section(sid)
+    df = case_frame(sec)
+    mesh = case_data(df).mesh
+    a1, a2, cut = slice_axes(plane)
+    coord = slice_coord(df, plane)
+    mask = df[cut].between(coord - SLICE_TOL, coord + SLICE_TOL).to_numpy()
+    slc = pd.DataFrame({a1: df[a1][mask], a2: df[a2][mask],
+                        "_key": mesh.nodes.key(a1, a2)[mask], "_row": np.flatnonzero(mask)})
+
+    # Layers select rows by Yn_elem (bounds inclusive), so a middle layer's
+    # upper interface rows are always resolved first by the layer above
+    new = resolve_contour_slice_by_layers(sec, slc, a1, a2)
+    old = baseline_resolve(sec, slc, a1, a2)
+    assert len(new) < len(slc)                      # there were duplicates to resolve
+    np.testing.assert_array_equal(new["_row"].to_numpy(), old["_row"].to_numpy())
+
+
+@pytest.mark.parametrize("sid", SECTIONS)
+@pytest.mark.parametrize("plane", ["XY", "YZ"])
+@pytest.mark.parametrize("box", [None, (3000.0, 6500.0, 4000.0, 5000.0)])
+def test_slice_operator_matches_griddata(sid, plane, box):
+    sec = load_section(sid)
+    df = case_frame(sec)
+    data = case_data(df)
+    coord = slice_coord(df, plane)
+    nodes = slice_nodes(sec, data.mesh, plane, coord, resolve_contour_slice_by_layers)
+    op = build_slice_operator(nodes, 40, box)
+    for field in ("E11", "E23", "U2"):
+        expected = baseline_slice(sec, df, plane, coord, field, op.g1, op.g2)
+        got = op.apply(df[field].to_numpy())
+        np.testing.assert_array_equal(np.isnan(got), np.isnan(expected))
+        peak = np.nanmax(np.abs(expected))
+        np.testing.assert_allclose(got, expected, rtol=1e-9, atol=1e-12 * peak, equal_nan=True)
+
+
+@pytest.mark.parametrize("plane", ["XY", "YZ"])
+def test_extract_contour_slice_matches_baseline(plane):
+    sec = load_section("TK_P1")
+    df = case_frame(sec, seed=3)
+    coord = slice_coord(df, plane)
+    result = extract_contour_slice(sec, case_data(df), 0, plane, coord, CONTOUR_FIELDS,
+                                   grid_res=60, ops=OperatorCache())
+
+    # The baseline grid: uniform along a1, 60/40 split 600 mm below the top
+    a1, a2, cut = slice_axes(plane)
+    slc = df[df[cut].between(coord - SLICE_TOL, coord + SLICE_TOL)]
+    g1 = np.linspace(slc[a1].min(), slc[a1].max(), 60)
+    top, bottom = slc[a2].max(), slc[a2].min()
+    g2 = np.concatenate([np.linspace(top, top - 600, 36), np.linspace(top - 600, bottom, 24)[1:]])
+    assert result["axis1"] == [round(float(v), 1) for v in g1]
+    assert result["depths"] == [round(float(MODEL_DEPTH - v), 1) for v in g2]
+
+    for field in CONTOUR_FIELDS:
+        scale, unit = field_unit(field)
+        expected = baseline_slice(sec, df, plane, coord, field, g1, g2) * scale
+        got = result["fields"][field]["values"].array
+        assert result["fields"][field]["unit"] == unit
+        np.testing.assert_allclose(got, expected, rtol=1e-9,
+                                   atol=1e-12 * np.nanmax(np.abs(expected)), equal_nan=True)
+
+
+@pytest.mark.parametrize("sid", SECTIONS)
+def test_node_index_matches_groupby(sid):
+    df = case_frame(load_section(sid), seed=1)
+    nodes = case_data(df).mesh.nodes
+    grouped = df.groupby(GEOMETRY, sort=True)["E11"].mean()
+
+    # Exact float keys: near-duplicates stay apart, exact duplicates merge
+    assert len(nodes) == len(df.drop_duplicates(subset=GEOMETRY)) == len(grouped)
+    np.testing.assert_array_equal(nodes.coords, np.array(grouped.index.tolist()))
+    np.testing.assert_allclose(nodes.mean(df["E11"].to_numpy()), grouped.to_numpy(), rtol=1e-12)
+    for cols in (GEOMETRY[:2], GEOMETRY[::2]):
+        a, b = cols
+        n_keys = len(np.unique(nodes.key(a, b)))
+        assert n_keys == len(df.drop_duplicates(subset=cols))
+
+
+@pytest.mark.parametrize("sid", SECTIONS)
+def test_node_index_wide_key_fallback(sid, monkeypatch):
+    df = case_frame(load_section(sid), seed=2)
+    mesh = case_data(df).mesh
+    nodes = mesh.nodes
+    cols = [GEOMETRY[:2], GEOMETRY[::2], GEOMETRY]
+    packed = [nodes.key(*c) for c in cols]
+
+    # Rank products past KEY_RANGE number the unique rows: same groups, same order
+    monkeypatch.setattr(mesh_module, "KEY_RANGE", 1)
+    wide = NodeIndex(mesh)
+    for c, key in zip(cols, packed):
+        np.testing.assert_array_equal(wide.key(*c), np.unique(key, return_inverse=True)[1])
+    for attr in ("first", "inverse", "counts", "coords"):
+        np.testing.assert_array_equal(getattr(wide, attr), getattr(nodes, attr))
@@ -0,0 +1,93 @@
+"""
+Incremental builds
+==================
+``BuildGraph`` staleness (inputs, upstream hashes, missing outputs, force,
+manifest of another folder), selective rebuilds of a cached case, and an
+interrupted animation resumed from its ``FrameCheckpoints``.
+"""
+
+import os
+import pytest
+
+from asphera.graph import BuildGraph, FrameCheckpoints
+from .conftest import tree
+
+
+def small_graph(out_dir, manifest, a=1, b=1, force=False):
+    g = BuildGraph(str(out_dir), str(manifest), force=force)
+    g.add("src", {"a": a})
+    g.add("left", {"b": b}, deps=["src"], outputs=["left.json"])
+    g.add("right", {}, deps=["src"], outputs=["right.json"])
+    return g
+
+
+def build_all(g):
+    for name in g.stale_outputs():
+        with open(g.files[name][0], "w") as f:
+            f.write(name)
+        g.done(name)
+
+
+def test_build_graph_staleness(tmp_path):
+    manifest = tmp_path / "cache" / "out.json"
+    g = small_graph(tmp_path, manifest)
+    assert g.stale_outputs() == ["left", "right"]           # no manifest yet
+    build_all(g)
+    assert small_graph(tmp_path, manifest).stale_outputs() == []
+
+    # An input change stales its node only; an upstream change stales every dependent
+    assert small_graph(tmp_path, manifest, b=2).stale_outputs() == ["left"]
+    assert small_graph(tmp_path, manifest, a=2).stale_outputs() == ["left", "right"]
+
+    os.remove(tmp_path / "right.json")
+    assert small_graph(tmp_path, manifest).stale_outputs() == ["right"]
+    build_all(small_graph(tmp_path, manifest))
+    assert small_graph(tmp_path, manifest, force=True).stale_outputs() == ["left", "right"]
+
+    # The manifest belongs to one output folder
+    other = tmp_path / "other"
+    other.mkdir()
+    for fn in ("left.json", "right.json"):
+        (other / fn).write_text("x")
+    assert small_graph(other, manifest).stale_outputs() == ["left", "right"]
+
+
+def test_cached_case_rebuilds_only_stale(run_case, tmp_path, capsys):
+    cache = str(tmp_path / "cache")
+    run_case(cache_dir=cache)
+    first = tree(run_case(cache_dir=cache))
+    assert "All artifacts up to date." in capsys.readouterr().out
+
+    # The output format touches structure, contours and point cloud, not the profiles
+    run_case(cache_dir=cache, fmt="binary")
+    assert "Stale: structure, contours, pointcloud\n" in capsys.readouterr().out
+    assert tree(run_case(cache_dir=cache)) == first
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_interrupted_animation_resumes(run_case, tmp_path, capsys, monkeypatch):
+    cache = str(tmp_path / "cache")
+    put = FrameCheckpoints.put
+    calls = []
+
+    def crash_after_five(self, key, frame):
+        put(self, key, frame)
+        calls.append(key)
+        if len(calls) == 5:
+            raise Interrupted(key)
+
+    monkeypatch.setattr(FrameCheckpoints, "put", crash_after_five)
+    with pytest.raises(Interrupted):
+        run_case(cache_dir=cache)
+    monkeypatch.undo()
+    capsys.readouterr()
+
+    resumed = tree(run_case(cache_dir=cache))
+    assert capsys.readouterr().out.count("[checkpoint]") == 5
+    assert resumed == tree(run_case("fresh"))
+    # Checkpoints are dropped once the contours are written
+    ckpt_root = os.path.join(cache, "checkpoints")
+    assert not any(files for _, _, files in os.walk(ckpt_root))
@@ -0,0 +1,127 @@
+"""
+Artifact writers
+================
+Binary round trip, switching the output format of an existing folder,
+precompressed variants of rewritten files, run reports kept out of the
+published tree, and the streaming JSON writer against ``json.dumps``.
+"""
+
+import gzip, json, os
+import numpy as np
+import pytest
+
+from asphera.compare import compare_cases
+from asphera.engine import report_path
+from asphera.trace import REPORT_FILE
+from asphera.output import (CHUNK_VALUES, Values, artifact_files, iter_json, precompress_all,
+                            read_artifact, to_jsonable, write_artifact)
+
+
+def sample_doc():
+    rng = np.random.default_rng(0)
+    grid = rng.normal(0.0, 50.0, (7, 11))
+    grid[2, 3:6] = np.nan
+    return {"axis1": Values(np.linspace(-500.0, 500.0, 11), 1),
+            "steps": Values(np.arange(1, 8), 0),
+            "fields": {"E11": {"values": Values(grid), "unit": "ue"},
+                       "big": {"values": Values(grid * 1e4), "unit": "Pa"}},
+            "meta": [{"name": "a", "n": 3}, None, 1.5]}
+
+
+def test_binary_round_trip(tmp_path):
+    doc = sample_doc()
+    write_artifact(str(tmp_path), "doc", doc, "binary", report=False)
+    back = read_artifact(str(tmp_path), "doc", "binary")
+
+    assert back["meta"] == doc["meta"]
+    assert back["fields"]["E11"]["unit"] == "ue"
+    np.testing.assert_array_equal(back["steps"], np.arange(1, 8))
+    np.testing.assert_allclose(back["axis1"], doc["axis1"].array, atol=0.05)
+    # Int16 at 4 decimals where it fits, Float32 otherwise; NaN gaps survive both
+    for f in ("E11", "big"):
+        src = doc["fields"][f]["values"].array
+        got = back["fields"][f]["values"]
+        assert got.shape == src.shape
+        np.testing.assert_array_equal(np.isnan(got), np.isnan(src))
+        np.testing.assert_allclose(got, np.round(src, 4), rtol=1e-6, atol=5e-5, equal_nan=True)
+
+
+def test_binary_matches_json(tmp_path):
+    doc = sample_doc()
+    write_artifact(str(tmp_path), "doc", doc, "json", report=False)
+    as_json = read_artifact(str(tmp_path), "doc", "json")
+    write_artifact(str(tmp_path), "doc", doc, "binary", report=False)
+    as_bin = read_artifact(str(tmp_path), "doc", "binary")
+    for f in ("E11", "big"):
+        ref = np.array(as_json["fields"][f]["values"], dtype=float)
+        np.testing.assert_allclose(as_bin["fields"][f]["values"], ref, rtol=1e-6, equal_nan=True)
+
+
+def test_switching_format_removes_the_other(run_case):
+    out = run_case(precompress=True)
+    assert os.path.exists(os.path.join(out, "pointcloud.json.gz"))
+
+    # Adaptive binary point cloud over a JSON lattice run (the stale lattice must go)
+    out = run_case(fmt="binary", points=400, precompress=True)
+    for name in ("contours", "pointcloud"):
+        for fn in artifact_files(name, "json"):
+            assert not any(f.startswith(fn) for f in os.listdir(out)), fn
+        assert os.path.exists(os.path.join(out, f"{name}.bin"))
+    pc = read_artifact(out, "pointcloud")
+    assert isinstance(pc["points"]["x"], np.ndarray) and "nx" not in pc
+    assert compare_cases(out, out)["pointcloud"] is None
+
+    out = run_case(precompress=True)
+    assert not any(f.startswith(("contours.", "pointcloud.")) and ".json" not in f
+                   for f in os.listdir(out))
+    assert "nx" in read_artifact(out, "pointcloud")
+
+
+@pytest.mark.parametrize("fmt", ["json", "binary"])
+def test_precompress_follows_rewrites(tmp_path, fmt):
+    out = str(tmp_path)
+    doc = sample_doc()
+    write_artifact(out, "doc", doc, fmt, report=False)
+    precompress_all(out)
+
+    # A rewrite whose mtime is older than the variants (clock skew, restored
+    # or copied files) must still get fresh ones
+    doc["meta"] = ["rewritten"]
+    doc["fields"]["E11"]["values"] = Values(doc["fields"]["E11"]["values"].array + 1.0)
+    write_artifact(out, "doc", doc, fmt, report=False)
+    for fn in artifact_files("doc", fmt):
+        os.utime(os.path.join(out, fn), (1, 1))
+        assert not os.path.exists(os.path.join(out, fn + ".gz"))
+    precompress_all(out)
+    for fn in artifact_files("doc", fmt):
+        path = os.path.join(out, fn)
+        with open(path, "rb") as f, gzip.open(path + ".gz") as g:
+            assert g.read() == f.read(), fn
+
+
+def test_run_report_outside_output(run_case, tmp_path):
+    out = run_case("plain")
+    with open(os.path.join(out, REPORT_FILE), "w") as f:        # left by an older version
+        f.write("{}")
+    for options in ({}, {"force": True}, {"cache_dir": str(tmp_path / "cache")}):
+        out = run_case("plain", **options)
+        assert not [fn for fn in os.listdir(out) if fn.startswith("run_report")]
+        assert os.path.exists(report_path(out, options.get("cache_dir")))
+    assert report_path(out).startswith(str(tmp_path / "tmp"))
+
+
+def test_iter_json_matches_json_dumps():
+    rng = np.random.default_rng(1)
+    tricky = np.array([0.00005, 0.00015, 1.00025, -2.50005, 1e-9, -0.0, 123456.78915,
+                       2.0 ** 53, np.nan, 0.125, 1e21, -7.0])
+    doc = sample_doc()
+    doc["tricky"] = Values(tricky)
+    doc["tricky2d"] = Values(np.tile(tricky, (3, 1)), 2)
+    doc["ints"] = Values(rng.normal(0, 1e3, 50), 0)
+    doc["cube"] = Values(rng.normal(0, 1, (2, 3, 4)), 3)
+    doc["long"] = Values(rng.normal(0, 1, CHUNK_VALUES * 2 + 7))
+    doc["empty"] = Values(np.zeros((0,)))
+    doc["plain"] = {"s": "µε \"q\"", "t": (1, 2), "nested": [[1, 2], {"k": None}], 3: True}
+
+    expected = json.dumps(doc, separators=(",", ":"), default=to_jsonable)
+    assert "".join(iter_json(doc)) == expected
@@ -0,0 +1,123 @@
+"""
+Critical timestep reduction
+===========================
+``CriticalTable`` (and the streamed ``is_more_critical`` fold) against a
+copy of the per-timestep pandas loop it replaced, for every profile
+definition of both sections, with repeated timesteps to exercise ties.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from asphera.config import IGNORE_SURFACE, TSTEP_RANGE, load_section
+from asphera.mesh import CaseData, Mesh
+from asphera.reduce import CriticalTable, is_more_critical
+from asphera.synthetic import mesh_nodes, synthetic_timestep
+
+SECTIONS = ["TK_P1", "FD_P1"]
+GEOMETRY = ["Xn_elem", "Yn_elem", "Zn_elem"]
+
+
+# ──────────────────────────────────────────────────────
+#  BASELINE IMPLEMENTATION (as it was replaced)
+# ──────────────────────────────────────────────────────
+def baseline_layer(sec, df, det_layer):
+    y_lo, y_hi = sec.y_ranges[det_layer]
+    layer = df[df["Yn_elem"].between(y_lo, y_hi)]
+    if det_layer == "AC1":
+        layer = layer[layer["Yn_elem"].between(y_lo, y_hi - IGNORE_SURFACE)]
+    return layer
+
+
+def baseline_critical(sec, data_list, component, det_layer):
+    best_val, best_idx = None, 0
+    start = TSTEP_RANGE[0] - 1
+    end   = TSTEP_RANGE[1]
+    for i in range(start, min(end, len(data_list))):
+        layer = baseline_layer(sec, data_list[i], det_layer)
+        if layer.empty:
+            continue
+        if component in ("E11", "E33"):
+            val = layer[component].max()
+        elif component == "E22":
+            val = layer[component].min()
+        else:
+            mx, mn = layer[component].max(), layer[component].min()
+            val = mx if abs(mx) >= abs(mn) else mn
+        if best_val is None:
+            best_val, best_idx = val, i
+        else:
+            if component in ("E11", "E33") and val > best_val:
+                best_val, best_idx = val, i
+            elif component == "E22" and val < best_val:
+                best_val, best_idx = val, i
+            elif component not in ("E11", "E33", "E22") and abs(val) > abs(best_val):
+                best_val, best_idx = val, i
+    return best_idx, best_val
+
+
+def baseline_location(sec, df, component, det_layer):
+    layer = baseline_layer(sec, df, det_layer)
+    if component in ("E11", "E33"):
+        crit_idx = layer[component].idxmax()
+    elif component == "E22":
+        crit_idx = layer[component].idxmin()
+    else:
+        mx, mn = layer[component].max(), layer[component].min()
+        crit_idx = layer[component].idxmax() if abs(mx) >= abs(mn) else layer[component].idxmin()
+    return crit_idx
+
+
+# ──────────────────────────────────────────────────────
+#  FIXTURES
+# ──────────────────────────────────────────────────────
+def case_frames(sec, n_ts=18):
+    """Node-sorted timesteps; 9 and 10 repeat 8 so the critical value ties."""
+    nodes = mesh_nodes(sec, nx=15, nz=9, per_layer=3)
+    frames = [synthetic_timestep(sec, nodes, ts, n_ts).sort_values("Node").reset_index(drop=True)
+              for ts in range(1, n_ts + 1)]
+    frames[8] = frames[9] = frames[7]
+    fields = [c for c in frames[0] if c not in ["Node"] + GEOMETRY]
+    # The stacks hold float32 fields; give the baseline the same numbers
+    for df in frames:
+        df[fields] = df[fields].astype(np.float32).astype(float)
+    mesh = Mesh(*(frames[0][c].to_numpy() for c in ["Node"] + GEOMETRY))
+    data = CaseData(mesh, range(1, n_ts + 1),
+                    {f: np.stack([df[f].to_numpy(np.float32) for df in frames]) for f in fields})
+    return frames, data
+
+
+# ──────────────────────────────────────────────────────
+#  TESTS
+# ──────────────────────────────────────────────────────
+@pytest.mark.parametrize("sid", SECTIONS)
+def test_critical_table_matches_loop(sid):
+    sec = load_section(sid)
+    frames, data = case_frames(sec)
+    table = CriticalTable.build(sec, data, [d[0] for d in sec.profile_defs])
+    for comp, det_layer, *_ in sec.profile_defs:
+        idx, val = baseline_critical(sec, frames, comp, det_layer)
+        ts_idx, crit, row = table.critical(comp, det_layer)
+        assert (ts_idx, crit) == (idx, val), (comp, det_layer)
+        assert row == baseline_location(sec, frames[idx], comp, det_layer)
+
+
+@pytest.mark.parametrize("sid", SECTIONS)
+def test_streamed_fold_matches_loop(sid):
+    sec = load_section(sid)
+    frames, data = case_frames(sec)
+    comps = [d[0] for d in sec.profile_defs]
+    start, end = TSTEP_RANGE[0] - 1, min(TSTEP_RANGE[1], len(data))
+    best = {}
+    for i in range(start, end):
+        frame = CaseData(data.mesh, [data.timesteps[i]],
+                         {f: data.fields[f][i:i + 1] for f in comps})
+        table = CriticalTable.build(sec, frame, comps)
+        for comp, det_layer, *_ in sec.profile_defs:
+            vals, _ = table.extreme(comp, det_layer)
+            key = (comp, det_layer)
+            if key not in best or is_more_critical(comp, float(vals[0]), best[key][1]):
+                best[key] = (i, float(vals[0]))
+    for comp, det_layer, *_ in sec.profile_defs:
+        assert best[(comp, det_layer)] == baseline_critical(sec, frames, comp, det_layer)
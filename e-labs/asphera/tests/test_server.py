@@ -0,0 +1,47 @@
+"""
+Query server status codes
+=========================
+Unknown cases, queries and files are 404; bad parameters 400; any other
+error (a KeyError from a bug included) is a logged 500.
+"""
+
+import asyncio, json
+import pytest
+
+from asphera import server
+from asphera.server import CaseStore, QueryServer
+from .conftest import SECTION
+
+
+@pytest.fixture
+def query_server(synthetic_case, tmp_path):
+    sec, case, ts_list, source = synthetic_case
+    qs = QueryServer(CaseStore([SECTION], source, str(tmp_path)), workers=1)
+    yield qs
+    qs.pool.shutdown()
+
+
+def get(qs, target):
+    status, body, _, _ = asyncio.run(qs.respond("GET", target, {}))
+    return status, json.loads(body)
+
+
+@pytest.mark.parametrize("target", ["/api/NOPE/slice", f"/api/{SECTION}/nope",
+                                    "/data/NOPE/structure.json", "/data/../secret", "/nope"])
+def test_unknown_is_404(query_server, target):
+    assert get(query_server, target)[0] == 404
+
+
+def test_bad_query_is_400(query_server):
+    status, body = get(query_server, f"/api/{SECTION}/slice?plane=XZ&coord=0")
+    assert status == 400 and "plane" in body["error"]
+
+
+def test_internal_key_error_is_500(query_server, monkeypatch, capsys):
+    def broken(case, query, ops):
+        return {}["missing"]
+
+    monkeypatch.setitem(server.QUERIES, "layers", broken)
+    status, body = get(query_server, f"/api/{SECTION}/layers?field=E22")
+    assert status == 500 and "KeyError" in body["error"]
+    assert "[FAIL]" in capsys.readouterr().out
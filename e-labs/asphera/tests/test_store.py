@@ -0,0 +1,64 @@
+"""
+Columnar timestep cache
+=======================
+Field columns are cached as float32 and reach the stacks without a copy,
+entries of another store version are reconverted, and a cached run writes
+the same files as an uncached one.
+"""
+
+import json, os
+import numpy as np
+
+from asphera.config import CONTOUR_FIELDS
+from asphera.mesh import iter_case
+from asphera.store import GEOMETRY_COLUMNS, load_timestep
+from .conftest import tree
+
+
+def memory_mapped(arr):
+    while arr is not None:
+        if isinstance(arr, np.memmap):
+            return True
+        arr = arr.base
+    return False
+
+
+def test_cached_columns_are_float32_views(synthetic_case, tmp_path):
+    sec, case, ts_list, source = synthetic_case
+    cache = str(tmp_path)
+    columns = GEOMETRY_COLUMNS + CONTOUR_FIELDS
+    fresh = load_timestep(source, case, ts_list[0], columns, cache_dir=cache)   # converts
+    cached = load_timestep(source, case, ts_list[0], columns, cache_dir=cache)
+    for c in GEOMETRY_COLUMNS[1:]:
+        assert cached[c].dtype == np.float64
+        np.testing.assert_array_equal(cached[c], fresh[c])
+    for c in CONTOUR_FIELDS:
+        assert cached[c].dtype == np.float32
+        np.testing.assert_array_equal(cached[c], fresh[c].to_numpy().astype(np.float32))
+
+    _, frame = next(iter_case(source, case, ts_list, columns, cache_dir=cache))
+    for c in CONTOUR_FIELDS:
+        assert frame.fields[c].dtype == np.float32
+        assert memory_mapped(frame.fields[c]), c
+
+
+def test_other_store_version_is_reconverted(synthetic_case, tmp_path, capsys):
+    sec, case, ts_list, source = synthetic_case
+    cache = str(tmp_path)
+    load_timestep(source, case, ts_list[0], cache_dir=cache)
+    meta_fp = os.path.join(cache, "columns", case, f"tire{ts_list[0]}", "meta.json")
+    with open(meta_fp) as f:
+        meta = json.load(f)
+    meta["code"] = "older"
+    with open(meta_fp, "w") as f:
+        json.dump(meta, f)
+    capsys.readouterr()
+    load_timestep(source, case, ts_list[0], cache_dir=cache)
+    assert "Converting" in capsys.readouterr().out
+
+
+def test_cached_run_matches_uncached(run_case, tmp_path):
+    cache = str(tmp_path / "cache")
+    plain = tree(run_case("plain"))
+    run_case("cached", cache_dir=cache)                          # converts
+    assert tree(run_case("cached", cache_dir=cache, force=True)) == plain
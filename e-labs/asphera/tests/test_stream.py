@@ -0,0 +1,31 @@
+"""
+Streamed runs
+=============
+``--stream`` (one timestep at a time) must write the same files, byte for
+byte, as a run on the whole loaded case.
+"""
+
+import pytest
+
+from .conftest import tree
+
+OPTIONS = [
+    {},
+    {"layout": "bundle", "envelope": True},
+    {"fmt": "binary", "anim_error": ("abs", 0.5), "points": 400},
+]
+
+
+@pytest.mark.parametrize("options", OPTIONS, ids=["default", "bundle-envelope", "binary-delta"])
+def test_stream_matches_batch(run_case, tmp_path, options):
+    batch = tree(run_case("batch", **options))
+    stream = tree(run_case("stream", stream=True, **options))
+    assert sorted(stream) == sorted(batch)
+    for name, data in batch.items():
+        assert stream[name] == data, name
+
+
+def test_stream_with_cache_matches_batch(run_case, tmp_path):
+    batch = tree(run_case("batch"))
+    stream = tree(run_case("stream", stream=True, cache_dir=str(tmp_path / "cache")))
+    assert stream == batch